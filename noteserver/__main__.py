@@ -15,7 +15,9 @@ import fire
 from noteserver import server
 
 
-def main(verbose: bool = False, log_path: Optional[str] = None):
+def main(verbose: bool = False,
+         log_path: Optional[str] = None,
+         memory_budget_mb: Optional[float] = None):
   """Launches Noteserver.
 
   Noteserver is a LSP server that works with most editors in order to help make
@@ -25,16 +27,24 @@ def main(verbose: bool = False, log_path: Optional[str] = None):
   Args:
     verbose: Include for additional logging.
     log_path: Set to write debug logs to a file.
+    memory_budget_mb: Set to bound the memory used to find related notes in
+      large vaults. Closed notes over the budget are reread from disk.
   """
   logging.basicConfig(filename=log_path,
                       filemode="w",
                       level=logging.DEBUG if verbose else logging.WARNING)
 
+  memory_budget = None
+  if memory_budget_mb is not None:
+    memory_budget = int(memory_budget_mb * 1024 * 1024)
+
   # Start server!
   while True:
     try:
       logging.info("Starting server!")
-      server.Server(reader=sys.stdin.buffer, writer=sys.stdout.buffer).run()
+      server.Server(reader=sys.stdin.buffer,
+                    writer=sys.stdout.buffer,
+                    memory_budget=memory_budget).run()
     except ValueError as error:
       logging.error("Encountered server error and restarting: %s", error)
 
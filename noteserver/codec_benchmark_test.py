@@ -0,0 +1,193 @@
+"""Benchmarks reading, parsing, and serializing LspMessages.
+
+These benchmarks take a while, so they are skipped unless the
+NOTESERVER_BENCHMARK environment variable is set:
+
+```
+# Fail if throughput regressed compared to the stored baselines.
+$ NOTESERVER_BENCHMARK=1 python -m unittest noteserver.codec_benchmark_test
+# Record new baselines, for instance after a speedup or on a new machine.
+$ NOTESERVER_BENCHMARK=update python -m unittest noteserver.codec_benchmark_test
+```
+
+Throughput depends on the machine, so baselines are stored locally in
+`codec_benchmark_baseline.json`, which is not checked in. Record them on the
+same machine that checks them, ideally while it is otherwise idle.
+"""
+
+import io
+import json
+import os
+import statistics
+import threading
+import time
+import unittest
+from typing import Callable, Dict, List
+from noteserver import lsp_message
+from noteserver import server
+from noteserver import testing_util
+
+_MODE = os.environ.get("NOTESERVER_BENCHMARK", "")
+_BASELINE_PATH = os.path.join(os.path.dirname(__file__),
+                              "codec_benchmark_baseline.json")
+# A benchmark fails if its throughput drops by more than this fraction.
+_MAX_REGRESSION = 0.3
+# Each measurement reports the median of this many samples, to reduce noise.
+_REPEATS = 5
+_MIN_SAMPLE_SECONDS = 0.1
+# A benchmark that seems to have regressed is measured up to this many more
+# times, and only fails if every measurement regressed. A short burst of load
+# on the machine then can't fail it, while a real slowdown still does.
+_RETRIES = 2
+# The approximate size of the content of each benchmarked message.
+_SIZES = {
+    "100B": 100,
+    "10KB": 10_000,
+    "1MB": 1_000_000,
+    "10MB": 10_000_000,
+}
+# Reading one byte at a time is slow, so only small messages are used.
+_SLOW_READER_SIZES = ["100B", "10KB"]
+
+
+def _make_messages(size: int) -> List[lsp_message.LspMessage]:
+  """Returns one message of each type, with content of roughly `size` bytes."""
+  text = ("Note text with [[links]] and unicode: é漢.\n" *
+          (size // 50 + 1))[:size]
+  return [
+      lsp_message.LspRequest(id=1,
+                             method="textDocument/didOpen",
+                             params={"text": text}),
+      lsp_message.LspNotification(method="textDocument/didChange",
+                                  params={"text": text}),
+      lsp_message.LspResponse(id=1, result=text),
+  ]
+
+
+def _throughput(run: Callable[[], None], num_bytes: int) -> float:
+  """Returns the median throughput of `run`, which handles `num_bytes`, in MB/s.
+
+  Each sample calls `run` enough times to take at least `_MIN_SAMPLE_SECONDS`,
+  so that fast operations on small messages are not dominated by timer noise.
+  """
+  samples = []
+  for _ in range(_REPEATS):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+      run()
+      calls += 1
+      elapsed = time.perf_counter() - start
+      if elapsed >= _MIN_SAMPLE_SECONDS:
+        break
+    samples.append(num_bytes / 1e6 / (elapsed / calls))
+  return statistics.median(samples)
+
+
+def _read_from_pipe(data: bytes) -> List[lsp_message.LspMessage]:
+  """Reads all of the messages in `data` after sending them through a pipe."""
+  read_fd, write_fd = os.pipe()
+
+  def write():
+    with os.fdopen(write_fd, "wb") as writer:
+      writer.write(data)
+
+  writer_thread = threading.Thread(target=write)
+  writer_thread.start()
+  with os.fdopen(read_fd, "rb") as reader:
+    messages = list(server.lsp_message_source(reader))
+  writer_thread.join()
+  return messages
+
+
+@unittest.skipUnless(_MODE, "Set NOTESERVER_BENCHMARK to run benchmarks.")
+class CodecBenchmarkTest(unittest.TestCase):
+  """Checks the throughput of the LSP codec against stored baselines."""
+
+  baselines: Dict[str, float] = {}
+  results: Dict[str, float] = {}
+
+  @classmethod
+  def setUpClass(cls):
+    if _MODE == "update":
+      return
+    if not os.path.exists(_BASELINE_PATH):
+      raise unittest.SkipTest("No baselines recorded. Run with "
+                              "NOTESERVER_BENCHMARK=update first.")
+    with open(_BASELINE_PATH, encoding="utf-8") as baseline_file:
+      cls.baselines = json.load(baseline_file)
+
+  @classmethod
+  def tearDownClass(cls):
+    if _MODE == "update":
+      with open(_BASELINE_PATH, "w", encoding="utf-8") as baseline_file:
+        json.dump(cls.results, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+  def _check(self, name: str, run: Callable[[], None], num_bytes: int):
+    """Measures `run` and fails if its throughput regressed from the baseline.
+
+    Args:
+      name: The name of the benchmark, which its baseline is stored under.
+      run: Performs the benchmarked operation once.
+      num_bytes: The number of bytes that `run` handles.
+    """
+    throughput = _throughput(run, num_bytes)
+    baseline = self.baselines.get(name)
+    if baseline is None:
+      self.results[name] = throughput
+      return
+    minimum = baseline * (1 - _MAX_REGRESSION)
+    for _ in range(_RETRIES):
+      if throughput >= minimum:
+        break
+      throughput = max(throughput, _throughput(run, num_bytes))
+    self.results[name] = throughput
+    with self.subTest(name):
+      self.assertGreaterEqual(
+          throughput, minimum,
+          f"{name} regressed to {throughput:.2f} MB/s from {baseline:.2f} MB/s")
+
+  def test_serialize(self):
+    """Serializes each type of message."""
+    for size_name, size in _SIZES.items():
+      for message in _make_messages(size):
+        self._check(f"serialize/{type(message).__name__}/{size_name}",
+                    message.serialize, len(message.serialize()))
+
+  def test_parse(self):
+    """Parses each type of message, without knowing the type in advance."""
+    for size_name, size in _SIZES.items():
+      for message in _make_messages(size):
+        data = message.serialize()
+        self._check(f"parse/{type(message).__name__}/{size_name}",
+                    lambda data=data: lsp_message.parse(data),
+                    len(data))
+
+  def test_source_bytes_io(self):
+    """Reads interleaved messages from an in-memory file."""
+    for size_name, size in _SIZES.items():
+      data = b"".join(message.serialize() for message in _make_messages(size))
+      self._check(
+          f"source/bytes_io/{size_name}",
+          lambda data=data: list(server.lsp_message_source(io.BytesIO(data))),
+          len(data))
+
+  def test_source_pipe(self):
+    """Reads interleaved messages from an OS pipe."""
+    for size_name, size in _SIZES.items():
+      data = b"".join(message.serialize() for message in _make_messages(size))
+      self._check(f"source/pipe/{size_name}",
+                  lambda data=data: _read_from_pipe(data),
+                  len(data))
+
+  def test_source_one_byte_reader(self):
+    """Reads interleaved messages from a reader that returns one byte a time."""
+    for size_name in _SLOW_READER_SIZES:
+      data = b"".join(
+          message.serialize() for message in _make_messages(_SIZES[size_name]))
+      self._check(
+          f"source/one_byte_reader/{size_name}",
+          lambda data=data: list(
+              server.lsp_message_source(testing_util.OneByteReader(data))),
+          len(data))
@@ -7,8 +7,100 @@ sent from the server to the client and await a response.
 
 """
 
-from typing import Iterable
+import dataclasses
+import logging
+import os
+import time
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Set, Tuple)
 from noteserver import lsp_message
+from noteserver import note_graph
+from noteserver import note_index
+from noteserver import note_similarity
+from noteserver import semantic_tokens
+from noteserver import workspace
+
+# LSP TextDocumentSyncKind.Full: The client always sends the whole document.
+_TEXT_DOCUMENT_SYNC_FULL = 1
+
+# LSP FileChangeType.Deleted, sent with workspace/didChangeWatchedFiles.
+_FILE_DELETED = 3
+
+# LSP SymbolKind.File, used for the workspace symbols that name notes.
+_SYMBOL_KIND_FILE = 1
+
+# The FileOperationRegistrationOptions for notes.
+_NOTE_FILE_OPERATIONS = {
+    "filters": [{
+        "pattern": {
+            "glob": f"**/*{workspace.NOTE_EXTENSION}"
+        }
+    }]
+}
+
+# When the client supplies a partialResultToken, results are streamed back in
+# `$/progress` notifications containing at most this many items each.
+_PARTIAL_RESULT_BATCH_SIZE = 256
+
+# The params of requests made at a position in a note, for `_check_params`.
+_POSITION_PARAMS = {
+    "textDocument.uri": str,
+    "position.line": int,
+    "position.character": int,
+}
+
+# Handles a single message sent from the client, producing messages for the
+# client in response.
+_Handler = Callable[[lsp_message.LspMessage], Iterable[lsp_message.LspMessage]]
+
+
+def _resident_set_size() -> Optional[int]:
+  """Returns the resident memory of this process in bytes, if it is known.
+
+  Only Linux exposes the current resident set size without extra dependencies,
+  so this returns None on other platforms.
+  """
+  try:
+    with open("/proc/self/statm", encoding="ascii") as statm:
+      return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, IndexError):
+    return None
+
+
+def _lookup(value: Any, path: str) -> Any:
+  """Returns the field at a dotted `path` in nested dicts, or None."""
+  for key in path.split("."):
+    if not isinstance(value, dict) or key not in value:
+      return None
+    value = value[key]
+  return value
+
+
+def _check_params(params: lsp_message.Parameter,
+                  required: Dict[str, type],
+                  optional: Optional[Dict[str, type]] = None) -> Optional[str]:
+  """Checks that `params` contains fields of the expected types.
+
+  Args:
+    params: The params sent with a request.
+    required: Maps dotted paths, such as "textDocument.uri", to the type of the
+      field at that path.
+    optional: Like `required`, but for fields that may be missing.
+
+  Returns:
+    A message describing the first invalid field, or None if all are valid.
+  """
+  expected_types = dict(required, **(optional or {}))
+  for path, expected_type in expected_types.items():
+    value = _lookup(params, path)
+    if value is None:
+      if path in required:
+        return f"Missing param: {path}"
+      continue
+    # Booleans are ints in Python, but not in JSON.
+    if not isinstance(value, expected_type) or isinstance(value, bool):
+      return f"Param {path} must be of type {expected_type.__name__}"
+  return None
 
 
 def _produce_not_impl_error(
@@ -36,12 +128,170 @@ def _produce_not_impl_error(
   ]
 
 
-class Dispatcher:  # pylint: disable=too-few-public-methods
+def _produce_error(request: lsp_message.LspRequest, code: int,
+                   message: str) -> Iterable[lsp_message.LspMessage]:
+  """Responds to `request` with an error."""
+  return [
+      lsp_message.LspResponse(id=request.id,
+                              error=lsp_message.LspError(code=code,
+                                                         message=message))
+  ]
+
+
+def _produce_progress(token: Any, value: Any) -> lsp_message.LspNotification:
+  """Creates a `$/progress` notification reporting `value` for `token`."""
+  return lsp_message.LspNotification(method="$/progress",
+                                     params={
+                                         "token": token,
+                                         "value": value
+                                     })
+
+
+def _produce_results(
+    request: lsp_message.LspRequest,
+    results: Iterable[Any]) -> Iterator[lsp_message.LspMessage]:
+  """Responds to `request` with a list of results.
+
+  If the client sent a partialResultToken, results are yielded in batches of
+  `$/progress` notifications as soon as they are produced, followed by a
+  response with an empty result list. Otherwise, the results are collected into
+  a single response.
+
+  Args:
+    request: The request that `results` answer.
+    results: The items that make up the result list.
+
+  Yields:
+    The messages that should be sent to the client, in order.
+  """
+  token = request.params.get("partialResultToken")
+  if token is None:
+    yield lsp_message.LspResponse(id=request.id, result=list(results))
+    return
+  batch: List[Any] = []
+  for result in results:
+    batch.append(result)
+    if len(batch) >= _PARTIAL_RESULT_BATCH_SIZE:
+      yield _produce_progress(token, batch)
+      batch = []
+  if batch:
+    yield _produce_progress(token, batch)
+  yield lsp_message.LspResponse(id=request.id, result=[])
+
+
+@dataclasses.dataclass
+class _ReindexQueue:
+  """The notes whose state of one kind, such as links, is out of date."""
+  # Maps the uri of each stale note to its latest text, and to the time at
+  # which it first became stale.
+  notes: Dict[str, Tuple[str, float]] = dataclasses.field(default_factory=dict)
+  # Totals over every note reindexed so far.
+  reindexed: int = 0
+  reindex_seconds: float = 0.0
+  wait_seconds: float = 0.0
+  max_wait_seconds: float = 0.0
+
+  def mark(self, uri: str, text: str):
+    """Records that `uri` now contains `text`."""
+    previous = self.notes.get(uri)
+    self.notes[uri] = (text,
+                       time.perf_counter() if previous is None else previous[1])
+
+  def discard(self, uri: str):
+    """Forgets the stale text of `uri`, if there is any."""
+    self.notes.pop(uri, None)
+
+  def refresh(self, kind: str, update: Callable[[str, str], None],
+              uris: Iterable[str]):
+    """Calls `update` with the text of each of `uris` that is stale.
+
+    Records how long the notes waited to be reindexed, and how long it took.
+    """
+    start = time.perf_counter()
+    count = 0
+    for uri in uris:
+      note = self.notes.pop(uri, None)
+      if note is None:
+        continue
+      text, stale_since = note
+      self.wait_seconds += start - stale_since
+      self.max_wait_seconds = max(self.max_wait_seconds, start - stale_since)
+      update(uri, text)
+      count += 1
+    if not count:
+      return
+    elapsed = time.perf_counter() - start
+    self.reindexed += count
+    self.reindex_seconds += elapsed
+    logging.debug("Reindexed the %s of %d notes in %.1f ms", kind, count,
+                  elapsed * 1000)
+
+  def get_content(self) -> Dict[str, Any]:
+    """Returns the number of stale notes, and totals for reindexed notes."""
+    return {
+        "pendingNotes": len(self.notes),
+        "reindexedNotes": self.reindexed,
+        "reindexSeconds": self.reindex_seconds,
+        "waitSeconds": self.wait_seconds,
+        "maxWaitSeconds": self.max_wait_seconds,
+    }
+
+
+class Dispatcher:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
   """Responsible for maintaining state between processes.
 
   Some functions may need to send and receive RPCs to and from the client.
   """
 
+  def __init__(self, memory_budget: Optional[int] = None):
+    """Initializes the dispatcher without any knowledge of notes.
+
+    Args:
+      memory_budget: The bytes that the words of closed notes may use before
+        they are evicted and reread from disk when needed. Unlimited if None.
+    """
+    self._index = note_index.NoteIndex()
+    self._graph = note_graph.NoteGraph()
+    self._similarity = note_similarity.SimilarityIndex(max_bytes=memory_budget,
+                                                       load=workspace.read_note)
+    self._tokens = semantic_tokens.SemanticTokenCache()
+    # The ClientCapabilities sent with the initialize request.
+    self._client_capabilities: Dict[str, Any] = {}
+    # The uris of the workspace folders whose notes are read from disk.
+    self._workspace_roots: List[str] = []
+    # Whether every note in the workspace has been indexed, rather than only
+    # the notes that the client opened.
+    self._workspace_indexed = False
+    self._open_uris: Set[str] = set()
+    self._next_request_id = 0
+    # The latest text of every note whose links, words, or tokens haven't been
+    # updated since it changed.
+    self._stale_links = _ReindexQueue()
+    self._stale_words = _ReindexQueue()
+    self._stale_tokens = _ReindexQueue()
+    self._handlers: Dict[str, _Handler] = {
+        "initialize": self._initialize,
+        "initialized": self._initialized,
+        "workspace/didChangeWatchedFiles": self._did_change_watched_files,
+        "workspace/didRenameFiles": self._did_rename_files,
+        "workspace/didDeleteFiles": self._did_delete_files,
+        "textDocument/didOpen": self._did_open,
+        "textDocument/didChange": self._did_change,
+        "textDocument/didClose": self._did_close,
+        "textDocument/prepareRename": self._prepare_rename,
+        "textDocument/rename": self._rename,
+        "textDocument/references": self._references,
+        "workspace/symbol": self._workspace_symbol,
+        "textDocument/semanticTokens/full": self._semantic_tokens_full,
+        "textDocument/semanticTokens/full/delta": self._semantic_tokens_delta,
+        "noteserver/graphNeighborhood": self._graph_neighborhood,
+        "noteserver/graphOrphans": self._graph_orphans,
+        "noteserver/graphShortestPath": self._graph_shortest_path,
+        "noteserver/graphHubs": self._graph_hubs,
+        "noteserver/relatedNotes": self._related_notes,
+        "noteserver/stats": self._stats,
+    }
+
   def __call__(
       self, client_message: lsp_message.LspMessage
   ) -> Iterable[lsp_message.LspMessage]:
@@ -54,4 +304,513 @@ class Dispatcher:  # pylint: disable=too-few-public-methods
       An iterable that produces RPCs that need to be sent from the server to
       the client.
     """
-    return _produce_not_impl_error(client_message)
+    if isinstance(client_message, lsp_message.LspResponse):
+      return []
+    handler = self._handlers.get(client_message.method)
+    if handler is None:
+      return _produce_not_impl_error(client_message)
+    return handler(client_message)
+
+  def _initialize(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Tells the client which features noteserver supports."""
+    capabilities = _lookup(request.params, "capabilities")
+    self._client_capabilities = capabilities if isinstance(capabilities,
+                                                           dict) else {}
+    folders = _lookup(request.params, "workspaceFolders")
+    if isinstance(folders, list):
+      self._workspace_roots = [
+          folder["uri"]
+          for folder in folders
+          if isinstance(_lookup(folder, "uri"), str)
+      ]
+    elif isinstance(_lookup(request.params, "rootUri"), str):
+      self._workspace_roots = [request.params["rootUri"]]
+    return [
+        lsp_message.LspResponse(
+            id=request.id,
+            result={
+                "capabilities": {
+                    "textDocumentSync": _TEXT_DOCUMENT_SYNC_FULL,
+                    "renameProvider": {
+                        "prepareProvider": True
+                    },
+                    "referencesProvider": True,
+                    "workspaceSymbolProvider": True,
+                    "workspace": {
+                        "fileOperations": {
+                            "didRename": _NOTE_FILE_OPERATIONS,
+                            "didDelete": _NOTE_FILE_OPERATIONS,
+                        }
+                    },
+                    "semanticTokensProvider": {
+                        "legend": {
+                            "tokenTypes": semantic_tokens.TOKEN_TYPES,
+                            "tokenModifiers": []
+                        },
+                        "full": {
+                            "delta": True
+                        },
+                    },
+                }
+            })
+    ]
+
+  def _initialized(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Indexes every note in the workspace, and watches them for changes.
+
+    Notes are read once, when the client is ready. After that, the client
+    reports changes to open notes through didChange, and changes made on disk
+    through didChangeWatchedFiles.
+    """
+    del notification  # Unused.
+    if not self._workspace_roots:
+      return []
+    start = time.perf_counter()
+    count = 0
+    for root in self._workspace_roots:
+      for uri in workspace.find_notes(root):
+        text = None if uri in self._open_uris else workspace.read_note(uri)
+        if text is not None:
+          self._index_closed_note(uri, text)
+          count += 1
+    self._workspace_indexed = True
+    logging.info("Indexed %d notes from the workspace in %.1f ms", count,
+                 (time.perf_counter() - start) * 1000)
+    if not _lookup(self._client_capabilities,
+                   "workspace.didChangeWatchedFiles.dynamicRegistration"):
+      return []
+    self._next_request_id += 1
+    return [
+        lsp_message.LspRequest(
+            id=self._next_request_id,
+            method="client/registerCapability",
+            params={
+                "registrations": [{
+                    "id": "noteserver/watchNotes",
+                    "method": "workspace/didChangeWatchedFiles",
+                    "registerOptions": {
+                        "watchers": [{
+                            "globPattern": f"**/*{workspace.NOTE_EXTENSION}"
+                        }]
+                    }
+                }]
+            })
+    ]
+
+  def _did_change_watched_files(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Re-reads the notes that changed on disk, and forgets deleted ones.
+
+    Open notes are skipped, since the client sends their text directly.
+    """
+    changes = _lookup(notification.params, "changes")
+    for change in changes if isinstance(changes, list) else []:
+      uri = _lookup(change, "uri")
+      if (not isinstance(uri, str) or not workspace.is_note(uri) or
+          uri in self._open_uris):
+        continue
+      text = None
+      if _lookup(change, "type") != _FILE_DELETED:
+        text = workspace.read_note(uri)
+      if text is None:
+        self._forget(uri)
+      else:
+        self._index_closed_note(uri, text)
+    return []
+
+  def _did_rename_files(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Moves the renamed notes to their new uris.
+
+    The old uris are forgotten. Unopened notes are read from their new
+    location, while open notes are sent by the client through didOpen.
+    """
+    files = _lookup(notification.params, "files")
+    for file in files if isinstance(files, list) else []:
+      old_uri, new_uri = _lookup(file, "oldUri"), _lookup(file, "newUri")
+      if not isinstance(old_uri, str) or not isinstance(new_uri, str):
+        continue
+      self._forget(old_uri)
+      if not workspace.is_note(new_uri) or new_uri in self._open_uris:
+        continue
+      text = workspace.read_note(new_uri)
+      if text is not None:
+        self._index_closed_note(new_uri, text)
+    return []
+
+  def _did_delete_files(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Forgets the deleted notes."""
+    files = _lookup(notification.params, "files")
+    for file in files if isinstance(files, list) else []:
+      uri = _lookup(file, "uri")
+      if isinstance(uri, str):
+        self._forget(uri)
+    return []
+
+  def _index_closed_note(self, uri: str, text: str):
+    """Indexes the links and words of a note that the client hasn't opened."""
+    self._stale_links.discard(uri)
+    self._stale_words.discard(uri)
+    self._update_links(uri, text)
+    self._similarity.update(uri, text)
+
+  def _forget(self, uri: str):
+    """Drops everything known about the note at `uri`."""
+    name = note_index.note_name(uri)
+    self._index.remove(uri)
+    if self._index.uri_for(name) is None:
+      self._graph.remove_note(name)
+    self._similarity.remove(uri)
+    self._tokens.remove(uri)
+    for stale in (self._stale_links, self._stale_words, self._stale_tokens):
+      stale.discard(uri)
+
+  def _mark_stale(self, uri: str, text: str):
+    """Records that `uri` now contains `text`, without indexing it yet.
+
+    Indexing waits until a request reads the state that depends on the text,
+    so that a burst of edits costs one reindex per note rather than one per
+    keystroke. Each request only brings the state it reads up to date: for
+    example, highlighting a note doesn't index the words of every other note.
+    """
+    self._stale_links.mark(uri, text)
+    self._stale_words.mark(uri, text)
+    self._stale_tokens.mark(uri, text)
+
+  def _update_links(self, uri: str, text: str):
+    """Indexes the links in `text` and adds them to the graph."""
+    if self._index.update(uri, text):
+      self._graph.set_note(note_index.note_name(uri), self._index.targets(uri))
+
+  def _refresh_links(self, uris: Optional[Iterable[str]] = None):
+    """Brings the index and graph up to date for `uris`, or for every note."""
+    self._stale_links.refresh(
+        "links", self._update_links,
+        list(self._stale_links.notes) if uris is None else uris)
+
+  def _refresh_words(self, uris: Optional[Iterable[str]] = None):
+    """Brings the similarity index up to date for `uris`, or for every note."""
+    self._stale_words.refresh(
+        "words", self._similarity.update,
+        list(self._stale_words.notes) if uris is None else uris)
+
+  def _refresh_tokens(self, uri: str):
+    """Brings the semantic tokens of `uri` up to date."""
+    self._stale_tokens.refresh("tokens", self._tokens.update, [uri])
+
+  def _did_open(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Schedules a newly opened note to be indexed."""
+    document = notification.params["textDocument"]
+    self._open_uris.add(document["uri"])
+    self._similarity.pin(document["uri"])
+    self._mark_stale(document["uri"], document["text"])
+    return []
+
+  def _did_change(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Schedules a changed note to be re-indexed.
+
+    Because we request full document sync, the last content change always
+    contains the entire text of the note.
+    """
+    uri = notification.params["textDocument"]["uri"]
+    changes = notification.params["contentChanges"]
+    if changes:
+      self._mark_stale(uri, changes[-1]["text"])
+    return []
+
+  def _did_close(
+      self,
+      notification: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Drops the state that is only needed while a note is open.
+
+    The links and words of the note stay indexed, because other notes may
+    still refer to it. They are indexed right away, so that the text of a
+    closed note is never held on to.
+    """
+    uri = notification.params["textDocument"]["uri"]
+    self._open_uris.discard(uri)
+    self._refresh_links([uri])
+    self._refresh_words([uri])
+    self._similarity.unpin(uri)
+    self._stale_tokens.discard(uri)
+    self._tokens.remove(uri)
+    return []
+
+  def _link_at_request_position(
+      self, request: lsp_message.LspMessage) -> Optional[note_index.Link]:
+    """Returns the link under the position described by `request`, if any.
+
+    Only the requested note is brought up to date, not every stale note.
+    """
+    uri = request.params["textDocument"]["uri"]
+    self._refresh_links([uri])
+    position = request.params["position"]
+    return self._index.link_at(uri, position["line"], position["character"])
+
+  def _prepare_rename(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Checks whether the position in `request` is a renameable link.
+
+    Responds with the range of the link target and its current name, or with
+    a null result if there is no link at that position.
+    """
+    error = _check_params(request.params, _POSITION_PARAMS)
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    link = self._link_at_request_position(request)
+    if link is None:
+      return [lsp_message.LspResponse(id=request.id)]
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result={
+                                    "range": link.span.get_content(),
+                                    "placeholder": link.target
+                                })
+    ]
+
+  def _client_can_rename_files(self) -> bool:
+    """Returns true if the client accepts WorkspaceEdits that rename files."""
+    workspace_edit = _lookup(self._client_capabilities,
+                             "workspace.workspaceEdit")
+    return bool(_lookup(workspace_edit, "documentChanges")) and "rename" in (
+        _lookup(workspace_edit, "resourceOperations") or [])
+
+  def _rename(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Renames the link target under the cursor in every note that uses it.
+
+    If the whole workspace is indexed, the target note is indexed, and the
+    client can rename files, the note itself is renamed too, so that the
+    edited links still point at it. Otherwise, notes that weren't indexed
+    could be left linking to a note that no longer exists. Names
+    that already belong to a note are rejected, since the renamed links would
+    then point at that note instead. The WorkspaceEdit is built entirely from
+    the backlinks stored in the index, so no note needs to be read or parsed
+    again.
+    """
+    error = _check_params(request.params, dict(_POSITION_PARAMS, newName=str))
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    new_name = request.params["newName"]
+    if not new_name or any(char in new_name for char in "[]/\n"):
+      return _produce_error(request, lsp_message.INVALID_PARAMS,
+                            f"Invalid note name: {new_name!r}")
+    link = self._link_at_request_position(request)
+    if link is None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS,
+                            "No link found at the requested position")
+    self._refresh_links()
+    if self._index.uri_for(new_name) is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS,
+                            f"A note named {new_name!r} already exists")
+    edits = {
+        uri: [{
+            "range": span.get_content(),
+            "newText": new_name
+        } for span in spans
+             ] for uri, spans in self._index.backlinks(link.target).items()
+    }
+    target_uri = self._index.uri_for(link.target)
+    if (target_uri is None or not self._workspace_indexed or
+        not self._client_can_rename_files()):
+      return [lsp_message.LspResponse(id=request.id, result={"changes": edits})]
+    # The links are edited before the note is renamed, so that every edit
+    # refers to a uri that still exists when it is applied.
+    document_changes: List[Dict[str, Any]] = [{
+        "textDocument": {
+            "uri": uri,
+            "version": None
+        },
+        "edits": uri_edits
+    } for uri, uri_edits in edits.items()]
+    document_changes.append({
+        "kind": "rename",
+        "oldUri": target_uri,
+        "newUri": note_index.renamed_uri(target_uri, new_name)
+    })
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result={"documentChanges": document_changes})
+    ]
+
+  def _references(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds every location that links to the target under the cursor."""
+    error = _check_params(request.params, _POSITION_PARAMS)
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    link = self._link_at_request_position(request)
+    if link is None:
+      return [lsp_message.LspResponse(id=request.id, result=[])]
+    self._refresh_links()
+    backlinks = self._index.backlinks(link.target)
+    locations = ({
+        "uri": uri,
+        "range": span.get_content()
+    } for uri, spans in backlinks.items() for span in spans)
+    return _produce_results(request, locations)
+
+  def _workspace_symbol(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds the notes whose names contain the query, ignoring case.
+
+    Names come from uris alone, so notes that haven't been indexed yet are
+    found without indexing them. Matches are streamed if the client sent a
+    partialResultToken.
+    """
+    error = _check_params(request.params, {"query": str})
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    query = request.params["query"].lower()
+    uris = dict.fromkeys(self._index.uris())
+    uris.update(dict.fromkeys(self._stale_links.notes))
+    symbols = ({
+        "name": note_index.note_name(uri),
+        "kind": _SYMBOL_KIND_FILE,
+        "location": {
+            "uri": uri,
+            "range": note_index.Span(line=0, start=0, end=0).get_content()
+        }
+    } for uri in uris if query in note_index.note_name(uri).lower())
+    return _produce_results(request, symbols)
+
+  def _graph_neighborhood(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds the notes within `hops` links of `note`."""
+    error = _check_params(request.params, {"note": str}, {"hops": int})
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    self._refresh_links()
+    neighborhood = self._graph.neighborhood(request.params["note"],
+                                            request.params.get("hops", 1))
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result=[{
+                                    "name": name,
+                                    "distance": distance
+                                } for name, distance in neighborhood])
+    ]
+
+  def _graph_orphans(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds the notes that nothing links to."""
+    self._refresh_links()
+    return [
+        lsp_message.LspResponse(id=request.id, result=self._graph.orphans())
+    ]
+
+  def _graph_shortest_path(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds the shortest chain of links from `source` to `target`."""
+    error = _check_params(request.params, {"source": str, "target": str})
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    self._refresh_links()
+    path = self._graph.shortest_path(request.params["source"],
+                                     request.params["target"])
+    return [lsp_message.LspResponse(id=request.id, result=path)]
+
+  def _graph_hubs(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Ranks the most central notes."""
+    error = _check_params(request.params, {}, {"limit": int})
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    self._refresh_links()
+    hubs = self._graph.hubs((request.params or {}).get("limit", 10))
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result=[{
+                                    "name": name,
+                                    "score": score
+                                } for name, score in hubs])
+    ]
+
+  def _related_notes(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Finds the notes whose words are most similar to the given note."""
+    error = _check_params(request.params, {"textDocument.uri": str},
+                          {"limit": int})
+    if error is not None:
+      return _produce_error(request, lsp_message.INVALID_PARAMS, error)
+    self._refresh_words()
+    related = self._similarity.related(request.params["textDocument"]["uri"],
+                                       request.params.get("limit", 10))
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result=[{
+                                    "uri": uri,
+                                    "score": score
+                                } for uri, score in related])
+    ]
+
+  def _stats(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Reports how much the server is storing, to help tune large vaults.
+
+    Notes that changed since links were last needed are counted as pending,
+    rather than indexed just to be counted. For links, words, and tokens, the
+    stats also report how long notes waited in line to be reindexed, and how
+    long reindexing them took, as well as how many notes have their words
+    evicted to stay within the memory budget.
+    """
+    return [
+        lsp_message.LspResponse(
+            id=request.id,
+            result={
+                "notes": self._index.num_notes(),
+                "links": self._index.num_links(),
+                "pendingNotes": len(self._stale_links.notes),
+                "reindexing": {
+                    "links": self._stale_links.get_content(),
+                    "words": self._stale_words.get_content(),
+                    "tokens": self._stale_tokens.get_content(),
+                },
+                "similarity": self._similarity.get_content(),
+                "residentBytes": _resident_set_size(),
+            })
+    ]
+
+  def _semantic_tokens_full(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Highlights the syntax of a whole note."""
+    uri = request.params["textDocument"]["uri"]
+    self._refresh_tokens(uri)
+    return [
+        lsp_message.LspResponse(id=request.id, result=self._tokens.full(uri))
+    ]
+
+  def _semantic_tokens_delta(
+      self,
+      request: lsp_message.LspMessage) -> Iterable[lsp_message.LspMessage]:
+    """Sends only the highlighting that changed since a previous result."""
+    uri = request.params["textDocument"]["uri"]
+    self._refresh_tokens(uri)
+    return [
+        lsp_message.LspResponse(id=request.id,
+                                result=self._tokens.delta(
+                                    uri, request.params["previousResultId"]))
+    ]
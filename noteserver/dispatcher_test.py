@@ -1,8 +1,15 @@
 """Tests for dispatcher.py"""
 
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 from noteserver import dispatcher
 from noteserver import lsp_message
+from noteserver import note_index
+from noteserver import note_similarity
+from noteserver import workspace
 
 
 class DispatcherTest(unittest.TestCase):
@@ -35,3 +42,764 @@ class DispatcherTest(unittest.TestCase):
                                     code=lsp_message.INTERNAL_ERROR,
                                     message="test/method not implemented"))
     ])
+
+
+def _open(test_dispatcher: dispatcher.Dispatcher, uri: str, text: str):
+  """Sends a didOpen notification to `test_dispatcher`."""
+  list(
+      test_dispatcher(
+          lsp_message.LspNotification(method="textDocument/didOpen",
+                                      params={
+                                          "textDocument": {
+                                              "uri": uri,
+                                              "languageId": "note",
+                                              "version": 1,
+                                              "text": text
+                                          }
+                                      })))
+
+
+def _position_params(uri: str, line: int, character: int) -> dict:
+  """Returns TextDocumentPositionParams."""
+  return {
+      "textDocument": {
+          "uri": uri
+      },
+      "position": {
+          "line": line,
+          "character": character
+      }
+  }
+
+
+# Client capabilities that allow WorkspaceEdits to rename files.
+_FILE_RENAME_CAPABILITIES = {
+    "workspace": {
+        "workspaceEdit": {
+            "documentChanges": True,
+            "resourceOperations": ["create", "rename", "delete"]
+        }
+    }
+}
+
+
+def _initialize(test_dispatcher: dispatcher.Dispatcher, capabilities: dict,
+                **params):
+  """Sends an initialize request with the client's `capabilities`."""
+  list(
+      test_dispatcher(
+          lsp_message.LspRequest(id=0,
+                                 method="initialize",
+                                 params=dict(params,
+                                             capabilities=capabilities))))
+
+
+class RenameTest(unittest.TestCase):
+  """Tests renaming links across notes."""
+
+  def setUp(self):
+    self.dispatcher = dispatcher.Dispatcher()
+    _open(self.dispatcher, "a.note", "see [[foo]]")
+    _open(self.dispatcher, "b.note", "[[foo]]\n[[bar]] [[foo]]")
+
+  def test_prepare_rename(self):
+    """Responds with the range and name of the link target."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/prepareRename",
+                                   params=_position_params("a.note", 0, 7))))
+    self.assertEqual(response, [
+        lsp_message.LspResponse(id=1,
+                                result={
+                                    "range": {
+                                        "start": {
+                                            "line": 0,
+                                            "character": 6
+                                        },
+                                        "end": {
+                                            "line": 0,
+                                            "character": 9
+                                        }
+                                    },
+                                    "placeholder": "foo"
+                                })
+    ])
+
+  def test_prepare_rename_not_on_link(self):
+    """Responds with a null result when there is nothing to rename."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/prepareRename",
+                                   params=_position_params("a.note", 0, 0))))
+    self.assertEqual(response, [lsp_message.LspResponse(id=1)])
+
+  def test_rename_edits_every_backlink(self):
+    """The WorkspaceEdit covers every note that links to the target."""
+    params = _position_params("a.note", 0, 7)
+    params["newName"] = "baz"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    self.assertEqual(len(response), 1)
+    changes = response[0].result["changes"]
+    self.assertEqual(sorted(changes), ["a.note", "b.note"])
+    self.assertEqual([
+        (edit["range"]["start"], edit["newText"]) for edit in changes["b.note"]
+    ], [({
+        "line": 0,
+        "character": 2
+    }, "baz"), ({
+        "line": 1,
+        "character": 10
+    }, "baz")])
+
+  def test_rename_outside_workspace_keeps_the_note(self):
+    """Without an indexed workspace, the target note is not renamed."""
+    _initialize(self.dispatcher, _FILE_RENAME_CAPABILITIES)
+    _open(self.dispatcher, "file:///notes/foo.note", "")
+    params = _position_params("a.note", 0, 7)
+    params["newName"] = "baz"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    self.assertEqual(sorted(response[0].result["changes"]),
+                     ["a.note", "b.note"])
+
+  def test_rename_without_file_rename_support(self):
+    """Clients that can't rename files only receive the link edits."""
+    _initialize(self.dispatcher, {})
+    _open(self.dispatcher, "file:///notes/foo.note", "")
+    params = _position_params("a.note", 0, 7)
+    params["newName"] = "baz"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    self.assertEqual(sorted(response[0].result["changes"]),
+                     ["a.note", "b.note"])
+
+  def test_rename_to_existing_note(self):
+    """Renaming a link to the name of another note is rejected."""
+    _initialize(self.dispatcher, _FILE_RENAME_CAPABILITIES)
+    _open(self.dispatcher, "file:///notes/foo.note", "")
+    params = _position_params("a.note", 0, 7)
+    params["newName"] = "b"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    self.assertEqual(response[0].error.code, lsp_message.INVALID_PARAMS)
+
+  def test_rename_invalid_name(self):
+    """Names that would break the link syntax are rejected."""
+    params = _position_params("a.note", 0, 7)
+    params["newName"] = "ba]]z"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    self.assertEqual(response[0].error.code, lsp_message.INVALID_PARAMS)
+
+
+class WorkspaceTest(unittest.TestCase):
+  """Tests indexing the notes on disk that the client hasn't opened."""
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.root)
+    self._write("a.note", "see [[foo]]")
+    self._write("foo.note", "")
+    self._write("c.note", "[[foo]] [[a]]")
+    self.dispatcher = dispatcher.Dispatcher()
+    capabilities = dict(_FILE_RENAME_CAPABILITIES)
+    capabilities["workspace"] = dict(
+        capabilities["workspace"],
+        didChangeWatchedFiles={"dynamicRegistration": True})
+    _initialize(self.dispatcher,
+                capabilities,
+                rootUri=workspace.path_to_uri(self.root))
+    self.initialized = list(
+        self.dispatcher(lsp_message.LspNotification(method="initialized")))
+
+  def _uri(self, name: str) -> str:
+    """Returns the uri of the note file `name` in the workspace."""
+    return workspace.path_to_uri(os.path.join(self.root, name))
+
+  def _write(self, name: str, text: str):
+    """Writes the note file `name` in the workspace."""
+    with open(os.path.join(self.root, name), "w",
+              encoding="utf-8") as note_file:
+      note_file.write(text)
+
+  def _referrers(self) -> list:
+    """Returns the sorted uris that link to `foo`."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/references",
+                                   params=_position_params(
+                                       self._uri("a.note"), 0, 7))))
+    return sorted(location["uri"] for location in response[0].result)
+
+  def test_memory_budget(self):
+    """Closed notes over the budget are evicted and reread when needed."""
+    test_dispatcher = dispatcher.Dispatcher(memory_budget=0)
+    _initialize(test_dispatcher, {}, rootUri=workspace.path_to_uri(self.root))
+    list(test_dispatcher(lsp_message.LspNotification(method="initialized")))
+    response = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="noteserver/relatedNotes",
+                                   params={
+                                       "textDocument": {
+                                           "uri": self._uri("a.note")
+                                       },
+                                       "limit": 5
+                                   })))
+    self.assertEqual([related["uri"] for related in response[0].result],
+                     [self._uri("c.note")])
+    response = list(
+        test_dispatcher(lsp_message.LspRequest(id=2,
+                                               method="noteserver/stats")))
+    self.assertEqual(response[0].result["similarity"]["estimatedBytes"], 0)
+
+  def test_registers_file_watcher(self):
+    """The client is asked to report changes to notes on disk."""
+    self.assertEqual(len(self.initialized), 1)
+    self.assertEqual(self.initialized[0].method, "client/registerCapability")
+
+  def test_references_include_unopened_notes(self):
+    """Notes on disk are indexed without being opened."""
+    self.assertEqual(
+        self._referrers(),
+        [self._uri("a.note"), self._uri("c.note")])
+
+  def test_rename_renames_the_note(self):
+    """The WorkspaceEdit covers unopened notes and renames the target."""
+    params = _position_params(self._uri("a.note"), 0, 7)
+    params["newName"] = "baz"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/rename",
+                                   params=params)))
+    document_changes = response[0].result["documentChanges"]
+    self.assertEqual(
+        sorted(
+            change["textDocument"]["uri"] for change in document_changes[:-1]),
+        [self._uri("a.note"), self._uri("c.note")])
+    self.assertEqual(
+        document_changes[-1], {
+            "kind": "rename",
+            "oldUri": self._uri("foo.note"),
+            "newUri": self._uri("baz.note")
+        })
+
+  def test_watched_file_changes(self):
+    """Notes created, changed, or deleted on disk are reindexed."""
+    os.remove(os.path.join(self.root, "c.note"))
+    self._write("d.note", "[[foo]]")
+    self.dispatcher(
+        lsp_message.LspNotification(method="workspace/didChangeWatchedFiles",
+                                    params={
+                                        "changes": [{
+                                            "uri": self._uri("c.note"),
+                                            "type": 3
+                                        }, {
+                                            "uri": self._uri("d.note"),
+                                            "type": 1
+                                        }]
+                                    }))
+    self.assertEqual(
+        self._referrers(),
+        [self._uri("a.note"), self._uri("d.note")])
+
+  def test_renamed_note_is_moved(self):
+    """After a note is renamed, its old uri is forgotten."""
+    os.rename(os.path.join(self.root, "foo.note"),
+              os.path.join(self.root, "baz.note"))
+    self.dispatcher(
+        lsp_message.LspNotification(method="workspace/didRenameFiles",
+                                    params={
+                                        "files": [{
+                                            "oldUri": self._uri("foo.note"),
+                                            "newUri": self._uri("baz.note")
+                                        }]
+                                    }))
+    orphans = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1, method="noteserver/graphOrphans")))
+    self.assertEqual(orphans[0].result, ["baz", "c"])
+    stats = list(
+        self.dispatcher(lsp_message.LspRequest(id=2,
+                                               method="noteserver/stats")))
+    self.assertEqual(stats[0].result["notes"], 3)
+
+  def test_renamed_open_note_is_moved(self):
+    """A renamed open note is indexed once, after it is closed and reopened."""
+    _open(self.dispatcher, self._uri("foo.note"), "[[c]]")
+    os.rename(os.path.join(self.root, "foo.note"),
+              os.path.join(self.root, "baz.note"))
+    self.dispatcher(
+        lsp_message.LspNotification(method="workspace/didRenameFiles",
+                                    params={
+                                        "files": [{
+                                            "oldUri": self._uri("foo.note"),
+                                            "newUri": self._uri("baz.note")
+                                        }]
+                                    }))
+    self.dispatcher(
+        lsp_message.LspNotification(
+            method="textDocument/didClose",
+            params={"textDocument": {
+                "uri": self._uri("foo.note")
+            }}))
+    _open(self.dispatcher, self._uri("baz.note"), "[[c]]")
+    orphans = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1, method="noteserver/graphOrphans")))
+    self.assertEqual(orphans[0].result, ["baz"])
+
+  def test_deleted_note_is_forgotten(self):
+    """Notes deleted by the client are forgotten."""
+    self.dispatcher(
+        lsp_message.LspNotification(
+            method="workspace/didDeleteFiles",
+            params={"files": [{
+                "uri": self._uri("c.note")
+            }]}))
+    self.assertEqual(self._referrers(), [self._uri("a.note")])
+
+  def test_open_notes_are_not_read(self):
+    """The client's text of an open note wins over the file on disk."""
+    _open(self.dispatcher, self._uri("c.note"), "")
+    self.dispatcher(
+        lsp_message.LspNotification(
+            method="workspace/didChangeWatchedFiles",
+            params={"changes": [{
+                "uri": self._uri("c.note"),
+                "type": 2
+            }]}))
+    self.assertEqual(self._referrers(), [self._uri("a.note")])
+
+
+class ReferencesTest(unittest.TestCase):
+  """Tests finding the backlinks of a link target."""
+
+  def setUp(self):
+    self.dispatcher = dispatcher.Dispatcher()
+    _open(self.dispatcher, "a.note", "[[foo]]")
+    # Enough backlinks to span multiple partial result batches.
+    _open(self.dispatcher, "b.note", "[[foo]]\n" * 300)
+
+  def test_references(self):
+    """Without a partialResultToken, all locations are in the response."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/references",
+                                   params=_position_params("a.note", 0, 3))))
+    self.assertEqual(len(response), 1)
+    self.assertEqual(len(response[0].result), 301)
+    self.assertEqual(
+        response[0].result[0], {
+            "uri": "a.note",
+            "range": {
+                "start": {
+                    "line": 0,
+                    "character": 2
+                },
+                "end": {
+                    "line": 0,
+                    "character": 5
+                }
+            }
+        })
+
+  def test_references_partial_results(self):
+    """With a partialResultToken, locations are streamed in batches."""
+    params = _position_params("a.note", 0, 3)
+    params["partialResultToken"] = "tok"
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/references",
+                                   params=params)))
+    self.assertEqual([type(message) for message in response], [
+        lsp_message.LspNotification, lsp_message.LspNotification,
+        lsp_message.LspResponse
+    ])
+    self.assertEqual([message.params["token"] for message in response[:2]],
+                     ["tok", "tok"])
+    self.assertEqual([len(message.params["value"]) for message in response[:2]],
+                     [256, 45])
+    self.assertEqual(response[2], lsp_message.LspResponse(id=1, result=[]))
+
+  def test_references_not_on_link(self):
+    """Responds with an empty list when there is no link to look up."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/references",
+                                   params=_position_params("a.note", 1, 0))))
+    self.assertEqual(response, [lsp_message.LspResponse(id=1, result=[])])
+
+
+class WorkspaceSymbolTest(unittest.TestCase):
+  """Tests finding notes by name."""
+
+  def test_workspace_symbol(self):
+    """Notes whose names contain the query are found, ignoring case."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "file:///notes/Meeting%20notes.note", "")
+    _open(test_dispatcher, "file:///notes/todo.note", "")
+    list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1, method="noteserver/graphOrphans")))
+    _change(test_dispatcher, "file:///notes/todo.note", "changed")
+    _open(test_dispatcher, "file:///notes/meetings.note", "")
+    response = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=2,
+                                   method="workspace/symbol",
+                                   params={"query": "MEET"})))
+    self.assertEqual(len(response), 1)
+    self.assertEqual([symbol["name"] for symbol in response[0].result],
+                     ["Meeting notes", "meetings"])
+    self.assertEqual(response[0].result[0]["location"]["uri"],
+                     "file:///notes/Meeting%20notes.note")
+
+  def test_workspace_symbol_streams_results(self):
+    """With a partialResultToken, symbols are sent in $/progress batches."""
+    test_dispatcher = dispatcher.Dispatcher()
+    for i in range(300):
+      _open(test_dispatcher, f"file:///notes/{i}.note", "")
+    response = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="workspace/symbol",
+                                   params={
+                                       "query": "",
+                                       "partialResultToken": "token"
+                                   })))
+    self.assertEqual([message.method for message in response[:-1]],
+                     ["$/progress", "$/progress"])
+    self.assertEqual(
+        sum(len(message.params["value"]) for message in response[:-1]), 300)
+    self.assertEqual(response[-1].result, [])
+
+
+class GraphTest(unittest.TestCase):
+  """Tests the custom noteserver/graph* requests."""
+
+  def setUp(self):
+    self.dispatcher = dispatcher.Dispatcher()
+    _open(self.dispatcher, "a.note", "[[b]]")
+    _open(self.dispatcher, "b.note", "[[c]]")
+
+  def _request(self, method: str, params: dict) -> lsp_message.LspResponse:
+    """Sends a request and returns its only response."""
+    response = list(
+        self.dispatcher(
+            lsp_message.LspRequest(id=1, method=method, params=params)))
+    self.assertEqual(len(response), 1)
+    return response[0]
+
+  def test_neighborhood(self):
+    """Neighbors are reported with their distance."""
+    self.assertEqual(
+        self._request("noteserver/graphNeighborhood", {
+            "note": "a",
+            "hops": 2
+        }).result, [{
+            "name": "b",
+            "distance": 1
+        }, {
+            "name": "c",
+            "distance": 2
+        }])
+
+  def test_orphans(self):
+    """Orphans reflect notes opened after a previous query."""
+    self.assertEqual(self._request("noteserver/graphOrphans", {}).result, ["a"])
+    _open(self.dispatcher, "d.note", "")
+    self.assertEqual(
+        self._request("noteserver/graphOrphans", {}).result, ["a", "d"])
+
+  def test_shortest_path(self):
+    """The path is a list of note names."""
+    self.assertEqual(
+        self._request("noteserver/graphShortestPath", {
+            "source": "a",
+            "target": "c"
+        }).result, ["a", "b", "c"])
+
+  def test_hubs(self):
+    """The limit caps the number of ranked notes."""
+    result = self._request("noteserver/graphHubs", {"limit": 1}).result
+    self.assertEqual([hub["name"] for hub in result], ["c"])
+
+
+class RelatedNotesTest(unittest.TestCase):
+  """Tests the custom noteserver/relatedNotes request."""
+
+  def test_related_notes(self):
+    """Reflects the latest text sent by didChange."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "a.note", "apples and pears")
+    _open(test_dispatcher, "b.note", "pears")
+    _open(test_dispatcher, "c.note", "bananas")
+    list(
+        test_dispatcher(
+            lsp_message.LspNotification(method="textDocument/didChange",
+                                        params={
+                                            "textDocument": {
+                                                "uri": "c.note",
+                                                "version": 2
+                                            },
+                                            "contentChanges": [{
+                                                "text": "apples"
+                                            }]
+                                        })))
+    response = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="noteserver/relatedNotes",
+                                   params={
+                                       "textDocument": {
+                                           "uri": "a.note"
+                                       },
+                                       "limit": 5
+                                   })))
+    self.assertEqual(sorted(related["uri"] for related in response[0].result),
+                     ["b.note", "c.note"])
+
+
+def _change(test_dispatcher: dispatcher.Dispatcher, uri: str, text: str):
+  """Sends a full-sync didChange notification to `test_dispatcher`."""
+  list(
+      test_dispatcher(
+          lsp_message.LspNotification(method="textDocument/didChange",
+                                      params={
+                                          "textDocument": {
+                                              "uri": uri
+                                          },
+                                          "contentChanges": [{
+                                              "text": text
+                                          }]
+                                      })))
+
+
+class ReindexTest(unittest.TestCase):
+  """Tests that indexing is deferred until a request reads the result."""
+
+  def test_changes_are_coalesced(self):
+    """A burst of edits to one note only parses the final text once."""
+    test_dispatcher = dispatcher.Dispatcher()
+    with mock.patch.object(note_index,
+                           "parse_links",
+                           wraps=note_index.parse_links) as parse_links:
+      _open(test_dispatcher, "a.note", "")
+      for i in range(100):
+        _change(test_dispatcher, "a.note", f"[[note{i}]]")
+      parse_links.assert_not_called()
+      response = list(
+          test_dispatcher(
+              lsp_message.LspRequest(id=1,
+                                     method="textDocument/prepareRename",
+                                     params=_position_params("a.note", 0, 3))))
+      parse_links.assert_called_once_with("[[note99]]")
+    self.assertEqual(response[0].result["placeholder"], "note99")
+
+  def test_prepare_rename_only_indexes_its_note(self):
+    """prepareRename doesn't wait for other notes to be indexed."""
+    test_dispatcher = dispatcher.Dispatcher()
+    for i in range(10):
+      _open(test_dispatcher, f"{i}.note", f"[[note{i}]]")
+    with mock.patch.object(note_index,
+                           "parse_links",
+                           wraps=note_index.parse_links) as parse_links:
+      response = list(
+          test_dispatcher(
+              lsp_message.LspRequest(id=1,
+                                     method="textDocument/prepareRename",
+                                     params=_position_params("3.note", 0, 3))))
+      parse_links.assert_called_once_with("[[note3]]")
+    self.assertEqual(response[0].result["placeholder"], "note3")
+
+  def test_requests_only_index_what_they_read(self):
+    """Highlighting a note doesn't index links or words."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "a.note", "[[b]]")
+    _open(test_dispatcher, "b.note", "# b")
+    with mock.patch.object(note_index, "parse_links") as parse_links, \
+        mock.patch.object(note_similarity.SimilarityIndex,
+                          "update") as update_words:
+      list(
+          test_dispatcher(
+              lsp_message.LspRequest(id=1,
+                                     method="textDocument/semanticTokens/full",
+                                     params={"textDocument": {
+                                         "uri": "b.note"
+                                     }})))
+      list(
+          test_dispatcher(
+              lsp_message.LspRequest(id=2, method="noteserver/unknown")))
+      parse_links.assert_not_called()
+      update_words.assert_not_called()
+
+  def test_close_indexes_note(self):
+    """Closing a note indexes it, so that its text isn't kept around."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "a.note", "[[b]]")
+    with mock.patch.object(note_similarity.SimilarityIndex,
+                           "update") as update_words:
+      test_dispatcher(
+          lsp_message.LspNotification(
+              method="textDocument/didClose",
+              params={"textDocument": {
+                  "uri": "a.note"
+              }}))
+      update_words.assert_called_once_with("a.note", "[[b]]")
+    response = list(
+        test_dispatcher(lsp_message.LspRequest(id=1,
+                                               method="noteserver/stats")))
+    self.assertEqual(response[0].result["links"], 1)
+    self.assertEqual(response[0].result["pendingNotes"], 0)
+
+
+class StatsTest(unittest.TestCase):
+  """Tests the custom noteserver/stats request."""
+
+  def test_stats(self):
+    """Counts the indexed notes and links, and the notes not yet indexed."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "a.note", "[[b]] [[c]]")
+    _open(test_dispatcher, "b.note", "")
+    response = list(
+        test_dispatcher(lsp_message.LspRequest(id=1,
+                                               method="noteserver/stats")))
+    self.assertEqual(response[0].result["notes"], 0)
+    self.assertEqual(response[0].result["pendingNotes"], 2)
+    self.assertIn("residentBytes", response[0].result)
+    list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=2, method="noteserver/graphOrphans")))
+    response = list(
+        test_dispatcher(lsp_message.LspRequest(id=3,
+                                               method="noteserver/stats")))
+    self.assertEqual(response[0].result["notes"], 2)
+    self.assertEqual(response[0].result["links"], 2)
+    self.assertEqual(response[0].result["pendingNotes"], 0)
+
+  def test_reindexing_stats(self):
+    """Reports how many notes of each kind were reindexed, and how slowly."""
+    test_dispatcher = dispatcher.Dispatcher()
+    with mock.patch.object(dispatcher.time, "perf_counter") as perf_counter:
+      perf_counter.return_value = 10.0
+      _open(test_dispatcher, "a.note", "[[b]]")
+      _open(test_dispatcher, "b.note", "")
+      perf_counter.return_value = 12.5
+      list(
+          test_dispatcher(
+              lsp_message.LspRequest(id=1, method="noteserver/graphOrphans")))
+    response = list(
+        test_dispatcher(lsp_message.LspRequest(id=2,
+                                               method="noteserver/stats")))
+    reindexing = response[0].result["reindexing"]
+    self.assertEqual(reindexing["links"]["reindexedNotes"], 2)
+    self.assertEqual(reindexing["links"]["waitSeconds"], 5.0)
+    self.assertEqual(reindexing["links"]["maxWaitSeconds"], 2.5)
+    self.assertEqual(reindexing["links"]["pendingNotes"], 0)
+    self.assertEqual(reindexing["words"]["reindexedNotes"], 0)
+    self.assertEqual(reindexing["words"]["pendingNotes"], 2)
+
+
+class SemanticTokensTest(unittest.TestCase):
+  """Tests highlighting notes through the dispatcher."""
+
+  def test_full_then_delta(self):
+    """A delta request after an edit only sends the changed tokens."""
+    test_dispatcher = dispatcher.Dispatcher()
+    _open(test_dispatcher, "a.note", "#a")
+    full = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1,
+                                   method="textDocument/semanticTokens/full",
+                                   params={"textDocument": {
+                                       "uri": "a.note"
+                                   }})))[0].result
+    self.assertEqual(len(full["data"]), 5)
+    _change(test_dispatcher, "a.note", "#a #b")
+    delta = list(
+        test_dispatcher(
+            lsp_message.LspRequest(
+                id=2,
+                method="textDocument/semanticTokens/full/delta",
+                params={
+                    "textDocument": {
+                        "uri": "a.note"
+                    },
+                    "previousResultId": full["resultId"]
+                })))[0].result
+    self.assertEqual(len(delta["edits"]), 1)
+    self.assertEqual(delta["edits"][0]["start"], 5)
+
+
+class InvalidParamsTest(unittest.TestCase):
+  """Tests that malformed custom requests produce errors, not exceptions."""
+
+  def test_invalid_params(self):
+    """Missing or mistyped params are reported as INVALID_PARAMS."""
+    test_dispatcher = dispatcher.Dispatcher()
+    for method, params in [
+        ("noteserver/graphNeighborhood", None),
+        ("noteserver/graphNeighborhood", {
+            "note": "a",
+            "hops": "2"
+        }),
+        ("noteserver/graphShortestPath", {
+            "source": "a"
+        }),
+        ("noteserver/graphHubs", {
+            "limit": True
+        }),
+        ("noteserver/relatedNotes", {
+            "textDocument": {}
+        }),
+        ("noteserver/relatedNotes", {
+            "textDocument": "a.note"
+        }),
+        ("textDocument/prepareRename", {
+            "textDocument": {
+                "uri": "a.note"
+            }
+        }),
+        ("textDocument/references", _position_params("a.note", 0, "0")),
+        ("textDocument/rename", _position_params("a.note", 0, 0)),
+        ("textDocument/rename", dict(_position_params("a.note", 0, 0),
+                                     newName=1)),
+    ]:
+      with self.subTest(method=method, params=params):
+        response = list(
+            test_dispatcher(
+                lsp_message.LspRequest(id=1, method=method, params=params)))
+        self.assertEqual(len(response), 1)
+        self.assertEqual(response[0].error.code, lsp_message.INVALID_PARAMS)
+
+  def test_optional_params(self):
+    """Requests without optional params succeed."""
+    test_dispatcher = dispatcher.Dispatcher()
+    response = list(
+        test_dispatcher(
+            lsp_message.LspRequest(id=1, method="noteserver/graphHubs")))
+    self.assertIsNone(response[0].error)
@@ -5,6 +5,17 @@ import json
 from typing import Dict, Any, Optional, List, Union
 
 
+def utf16_len(text: str) -> int:
+  """Returns the length of `text` in UTF-16 code units.
+
+  LSP positions count characters in UTF-16 code units, so characters outside
+  the Basic Multilingual Plane, such as most emoji, count as two.
+  """
+  if text.isascii():
+    return len(text)
+  return len(text) + sum(1 for char in text if ord(char) > 0xFFFF)
+
+
 def _serialize_content_with_header(content: Dict[str, Any]) -> bytes:
   """Writes serialized LSP message that includes a header and content."""
   serialized_content = json.dumps(content).encode("utf-8")
@@ -166,3 +166,13 @@ class LSPMessageTest(unittest.TestCase):
                                        error=lsp_message.LspError(
                                            code=3, message="msg"))
     self.assertEqual(str(response), "Response[1] : < Error[3] : msg > : 2")
+
+
+class Utf16LenTest(unittest.TestCase):
+  """Tests measuring text in UTF-16 code units."""
+
+  def test_utf16_len(self):
+    """Only characters outside the BMP count as two code units."""
+    self.assertEqual(lsp_message.utf16_len("abc"), 3)
+    self.assertEqual(lsp_message.utf16_len("é漢"), 2)
+    self.assertEqual(lsp_message.utf16_len("a😀b"), 4)
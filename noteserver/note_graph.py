@@ -0,0 +1,318 @@
+"""Answers graph-level questions about how notes link to each other.
+
+Every note name is assigned a stable integer id, and the links between notes
+are stored in compressed sparse row (CSR) form: `offsets[i]:offsets[i+1]` is the
+slice of `neighbors` holding the neighbors of node `i`. Both the outgoing and
+incoming adjacency are kept so that traversals in either direction are cheap.
+
+Changing a note's links doesn't rebuild the arrays. Instead, the changed rows
+are recorded in a small overlay that takes precedence over the CSR arrays. Once
+the overlay grows large enough, it is compacted back into new arrays.
+"""
+
+import array
+import collections
+import heapq
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# The overlay is compacted into the CSR arrays once it holds the outgoing links
+# of more than this fraction of the nodes...
+_COMPACTION_FRACTION = 1 / 16
+# ...and of more than this many nodes.
+_MIN_COMPACTION_SIZE = 1024
+
+# PageRank parameters. `_DAMPING` is the probability of following a link rather
+# than jumping to a random note. Ranking stops early once the total change in
+# rank between iterations falls below `_TOLERANCE`.
+_DAMPING = 0.85
+_MAX_ITERATIONS = 20
+_TOLERANCE = 1e-4
+
+
+def _build_csr(num_nodes: int, rows: array.array,
+               columns: array.array) -> Tuple[array.array, array.array]:
+  """Packs the edges `rows[i] -> columns[i]` into CSR arrays.
+
+  Args:
+    num_nodes: The number of nodes in the graph.
+    rows: The id each edge starts from.
+    columns: The id each edge points to.
+
+  Returns:
+    The `offsets` and `neighbors` arrays describing the graph.
+  """
+  offsets = array.array("l", [0]) * (num_nodes + 1)
+  for row in rows:
+    offsets[row + 1] += 1
+  for i in range(num_nodes):
+    offsets[i + 1] += offsets[i]
+  neighbors = array.array("l", [0]) * len(columns)
+  cursor = offsets[:-1]
+  for row, column in zip(rows, columns):
+    neighbors[cursor[row]] = column
+    cursor[row] += 1
+  return offsets, neighbors
+
+
+class NoteGraph:  # pylint: disable=too-many-instance-attributes
+  """A CSR graph of the links between notes.
+
+  Ids are never reassigned. Link changes are applied to an overlay in time
+  proportional to the number of links of the changed note, and the overlay is
+  compacted into the CSR arrays by the first query after it grows too large.
+  """
+
+  def __init__(self):
+    """Creates an empty graph."""
+    self._ids: Dict[str, int] = {}
+    self._names: List[str] = []
+    # Set to 1 for nodes that correspond to an indexed note, as opposed to a
+    # link target that doesn't have a note (yet).
+    self._is_note = bytearray()
+    self._out_offsets = array.array("l", [0])
+    self._out_neighbors = array.array("l")
+    self._in_offsets = array.array("l", [0])
+    self._in_neighbors = array.array("l")
+    # The outgoing links of nodes that changed since the last compaction. These
+    # replace the nodes' rows in the CSR arrays.
+    self._out_overlay: Dict[int, List[int]] = {}
+    # The incoming links that were added to, or removed from, the nodes' rows
+    # in the CSR arrays since the last compaction.
+    self._in_added: Dict[int, Set[int]] = {}
+    self._in_removed: Dict[int, Set[int]] = {}
+    # Incremented whenever any link changes, so that cached ranks are only
+    # recomputed when needed.
+    self._version = 0
+    self._ranks_version = -1
+    self._ranks: List[float] = []
+
+  def _intern(self, name: str) -> int:
+    """Returns the id of `name`, assigning a new one if needed."""
+    node = self._ids.get(name)
+    if node is None:
+      node = self._ids[name] = len(self._names)
+      self._names.append(name)
+      self._is_note.append(0)
+    return node
+
+  def set_note(self, name: str, targets: Iterable[str]):
+    """Records that the note `name` links to exactly `targets`."""
+    node = self._intern(name)
+    new = {self._intern(target) for target in targets if target != name}
+    old = set(self._out(node))
+    if self._is_note[node] and old == new:
+      return
+    self._is_note[node] = 1
+    self._set_out(node, old, new)
+
+  def remove_note(self, name: str):
+    """Forgets the note `name` and its links, but not the links to it."""
+    node = self._ids.get(name)
+    if node is None or not self._is_note[node]:
+      return
+    self._is_note[node] = 0
+    self._set_out(node, set(self._out(node)), set())
+
+  def _set_out(self, node: int, old: Set[int], new: Set[int]):
+    """Replaces the outgoing links of `node`."""
+    for target in old - new:
+      added = self._in_added.get(target)
+      if added is not None and node in added:
+        added.discard(node)
+      else:
+        self._in_removed.setdefault(target, set()).add(node)
+    for target in new - old:
+      removed = self._in_removed.get(target)
+      if removed is not None and node in removed:
+        removed.discard(node)
+      else:
+        self._in_added.setdefault(target, set()).add(node)
+    self._out_overlay[node] = list(new)
+    self._version += 1
+
+  def _maybe_compact(self):
+    """Packs the overlay into new CSR arrays if it has grown too large."""
+    if len(self._out_overlay) <= max(_MIN_COMPACTION_SIZE,
+                                     _COMPACTION_FRACTION * len(self._names)):
+      return
+    sources = array.array("l")
+    targets = array.array("l")
+    for node in range(len(self._names)):
+      row = self._out(node)
+      sources.extend([node] * len(row))
+      targets.extend(row)
+    num_nodes = len(self._names)
+    self._out_offsets, self._out_neighbors = _build_csr(num_nodes, sources,
+                                                        targets)
+    self._in_offsets, self._in_neighbors = _build_csr(num_nodes, targets,
+                                                      sources)
+    self._out_overlay.clear()
+    self._in_added.clear()
+    self._in_removed.clear()
+
+  def _out(self, node: int) -> Sequence[int]:
+    """Returns the ids that `node` links to."""
+    row = self._out_overlay.get(node)
+    if row is not None:
+      return row
+    if node + 1 >= len(self._out_offsets):
+      return ()
+    start, end = self._out_offsets[node], self._out_offsets[node + 1]
+    return self._out_neighbors[start:end]
+
+  def _in(self, node: int) -> Sequence[int]:
+    """Returns the ids that link to `node`."""
+    if node + 1 < len(self._in_offsets):
+      start, end = self._in_offsets[node], self._in_offsets[node + 1]
+      row: Sequence[int] = self._in_neighbors[start:end]
+    else:
+      row = ()
+    added = self._in_added.get(node)
+    removed = self._in_removed.get(node)
+    if not added and not removed:
+      return row
+    if removed:
+      row = [source for source in row if source not in removed]
+    return list(row) + list(added or ())
+
+  def _in_degrees(self) -> List[int]:
+    """Returns the number of nodes that link to each node."""
+    offsets = self._in_offsets
+    degrees = [end - start for start, end in zip(offsets, offsets[1:])]
+    degrees.extend([0] * (len(self._names) - len(degrees)))
+    for node, added in self._in_added.items():
+      degrees[node] += len(added)
+    for node, removed in self._in_removed.items():
+      degrees[node] -= len(removed)
+    return degrees
+
+  def neighborhood(self, name: str, hops: int) -> List[Tuple[str, int]]:
+    """Finds the notes within `hops` links of `name`, in either direction.
+
+    Args:
+      name: The note at the center of the neighborhood.
+      hops: The maximum number of links to follow.
+
+    Returns:
+      (name, distance) pairs sorted by distance then name. Excludes `name`.
+    """
+    self._maybe_compact()
+    start = self._ids.get(name)
+    if start is None:
+      return []
+    distance = array.array("l", [-1]) * len(self._names)
+    distance[start] = 0
+    frontier = [start]
+    for hop in range(1, hops + 1):
+      next_frontier = []
+      for node in frontier:
+        for neighbor in (*self._out(node), *self._in(node)):
+          if distance[neighbor] < 0:
+            distance[neighbor] = hop
+            next_frontier.append(neighbor)
+      if not next_frontier:
+        break
+      frontier = next_frontier
+    return sorted(((self._names[node], dist)
+                   for node, dist in enumerate(distance)
+                   if dist > 0),
+                  key=lambda pair: (pair[1], pair[0]))
+
+  def orphans(self) -> List[str]:
+    """Returns the sorted names of notes that no other note links to."""
+    degrees = self._in_degrees()
+    return sorted(self._names[node]
+                  for node, is_note in enumerate(self._is_note)
+                  if is_note and not degrees[node])
+
+  def shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+    """Finds the fewest links to follow to get from `source` to `target`.
+
+    Args:
+      source: The name of the note to start at.
+      target: The name of the note to end at.
+
+    Returns:
+      The names along the path, including `source` and `target`, or None if
+      `target` cannot be reached.
+    """
+    self._maybe_compact()
+    start, end = self._ids.get(source), self._ids.get(target)
+    if start is None or end is None:
+      return None
+    parent = array.array("l", [-1]) * len(self._names)
+    parent[start] = start
+    queue = collections.deque([start])
+    while queue and parent[end] < 0:
+      node = queue.popleft()
+      for neighbor in self._out(node):
+        if parent[neighbor] < 0:
+          parent[neighbor] = node
+          queue.append(neighbor)
+    if parent[end] < 0:
+      return None
+    path = [end]
+    while path[-1] != start:
+      path.append(parent[path[-1]])
+    return [self._names[node] for node in reversed(path)]
+
+  def _page_rank(self, live: List[int]) -> List[float]:
+    """Computes the PageRank of the `live` nodes.
+
+    Iteration starts from the previously computed ranks, if there are any, so
+    that a few changed links only take a few iterations to converge.
+    """
+    teleport = 1.0 / len(live)
+    rank = [0.0] * len(self._names)
+    for node in live:
+      previous = self._ranks[node] if node < len(self._ranks) else 0.0
+      rank[node] = previous or teleport
+    total = sum(rank)
+    rank = [value / total for value in rank]
+    out_degree = [len(self._out(node)) for node in range(len(self._names))]
+    for _ in range(_MAX_ITERATIONS):
+      contribution = [
+          value / degree if degree else 0.0
+          for value, degree in zip(rank, out_degree)
+      ]
+      dangling = sum(rank[node] for node in live if not out_degree[node])
+      base = (1.0 - _DAMPING + _DAMPING * dangling) * teleport
+      new_rank = [0.0] * len(self._names)
+      for node in live:
+        new_rank[node] = base + _DAMPING * sum(contribution[source]
+                                               for source in self._in(node))
+      delta = sum(abs(new_rank[node] - rank[node]) for node in live)
+      rank = new_rank
+      if delta < _TOLERANCE:
+        break
+    return rank
+
+  def hubs(self, limit: int) -> List[Tuple[str, float]]:
+    """Ranks notes by PageRank, so that heavily linked notes come first.
+
+    Only nodes that are notes, or that are linked to, take part in the ranking.
+    Ranks are cached until a link changes. Computing them costs up to
+    `_MAX_ITERATIONS` passes over every link.
+
+    Args:
+      limit: The maximum number of notes to return.
+
+    Returns:
+      Up to `limit` (name, score) pairs, highest score first.
+    """
+    self._maybe_compact()
+    degrees = self._in_degrees()
+    live = [
+        node for node, is_note in enumerate(self._is_note)
+        if is_note or degrees[node]
+    ]
+    if not live:
+      return []
+    if self._ranks_version != self._version:
+      self._ranks = self._page_rank(live)
+      self._ranks_version = self._version
+    ranked = heapq.nsmallest(limit,
+                             live,
+                             key=lambda node:
+                             (-self._ranks[node], self._names[node]))
+    return [(self._names[node], self._ranks[node]) for node in ranked]
@@ -0,0 +1,72 @@
+"""Tests for note_graph.py"""
+
+import unittest
+from unittest import mock
+from noteserver import note_graph
+
+
+class NoteGraphTest(unittest.TestCase):
+  """Tests graph queries over a small set of notes."""
+
+  def setUp(self):
+    # a -> b -> c -> d, a -> c, e is isolated, and c also links to missing.
+    self.graph = note_graph.NoteGraph()
+    self.graph.set_note("a", ["b", "c"])
+    self.graph.set_note("b", ["c"])
+    self.graph.set_note("c", ["d", "missing", "c"])
+    self.graph.set_note("d", [])
+    self.graph.set_note("e", [])
+
+  def test_neighborhood(self):
+    """Follows links in both directions up to the hop limit."""
+    self.assertEqual(self.graph.neighborhood("b", 1), [("a", 1), ("c", 1)])
+    self.assertEqual(self.graph.neighborhood("b", 2), [("a", 1), ("c", 1),
+                                                       ("d", 2),
+                                                       ("missing", 2)])
+    self.assertEqual(self.graph.neighborhood("e", 3), [])
+    self.assertEqual(self.graph.neighborhood("unknown", 3), [])
+
+  def test_orphans(self):
+    """Self links don't count as backlinks."""
+    self.assertEqual(self.graph.orphans(), ["a", "e"])
+
+  def test_shortest_path(self):
+    """Paths follow the direction of links."""
+    self.assertEqual(self.graph.shortest_path("a", "d"), ["a", "c", "d"])
+    self.assertEqual(self.graph.shortest_path("a", "a"), ["a"])
+    self.assertIsNone(self.graph.shortest_path("d", "a"))
+    self.assertIsNone(self.graph.shortest_path("a", "unknown"))
+
+  def test_hubs(self):
+    """The most linked-to notes are ranked first."""
+    hubs = self.graph.hubs(limit=2)
+    self.assertEqual([name for name, _ in hubs], ["c", "d"])
+    scores = [score for _, score in self.graph.hubs(limit=10)]
+    self.assertEqual(len(scores), 6)
+    self.assertAlmostEqual(sum(scores), 1.0, places=4)
+
+  def test_set_note_after_query(self):
+    """Queries reflect links that changed after a previous query."""
+    self.assertEqual(self.graph.orphans(), ["a", "e"])
+    self.graph.set_note("e", ["a"])
+    self.assertEqual(self.graph.orphans(), ["e"])
+    self.graph.set_note("e", [])
+    self.assertEqual(self.graph.orphans(), ["a", "e"])
+    self.graph.remove_note("e")
+    self.assertEqual(self.graph.orphans(), ["a"])
+
+  def test_hubs_are_recomputed_after_changes(self):
+    """Cached ranks are not reused once the links change."""
+    self.assertEqual(self.graph.hubs(limit=1)[0][0], "c")
+    for name in ["x", "y", "z"]:
+      self.graph.set_note(name, ["e"])
+    self.assertEqual(self.graph.hubs(limit=1)[0][0], "e")
+
+  def test_compaction(self):
+    """Compacting the overlay into CSR arrays doesn't change any answers."""
+    with mock.patch.object(note_graph, "_MIN_COMPACTION_SIZE", 0):
+      self.graph.set_note("e", ["a"])
+      self.graph.set_note("b", ["d"])
+      self.assertEqual(self.graph.orphans(), ["e"])
+      self.assertEqual(self.graph.shortest_path("e", "b"), ["e", "a", "b"])
+      self.assertEqual(self.graph.neighborhood("d", 1), [("b", 1), ("c", 1)])
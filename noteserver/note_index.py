@@ -0,0 +1,176 @@
+"""Keeps track of the links between notes.
+
+Notes reference each other using wiki-style links, such as `[[other note]]`.
+The NoteIndex records the location of every link in every note that the client
+has sent us, as well as the reverse mapping from a link target to all of the
+places that reference it. Queries like "rename this note" can then be answered
+from the stored spans, without reading or re-parsing any files.
+"""
+
+import dataclasses
+import posixpath
+import re
+from typing import Any, Dict, List, Optional, Set
+from urllib import parse
+from noteserver import lsp_message
+
+# Matches `[[target]]`. The first group contains the link target.
+_LINK_PATTERN = re.compile(r"\[\[([^\[\]\n]+)\]\]")
+
+
+@dataclasses.dataclass(frozen=True)
+class Span:
+  """Describes a range of characters on a single line of a note.
+
+  Like LSP positions, `start` and `end` count UTF-16 code units.
+  """
+  line: int
+  start: int
+  end: int
+
+  def contains(self, line: int, character: int) -> bool:
+    """Returns true if the position (line, character) falls within the span."""
+    return line == self.line and self.start <= character <= self.end
+
+  def get_content(self) -> Dict[str, Any]:
+    """Returns this span as an LSP Range."""
+    return {
+        "start": {
+            "line": self.line,
+            "character": self.start
+        },
+        "end": {
+            "line": self.line,
+            "character": self.end
+        },
+    }
+
+
+@dataclasses.dataclass(frozen=True)
+class Link:
+  """Describes a `[[target]]` link found in a note.
+
+  The span only covers the target text, not the surrounding brackets.
+  """
+  target: str
+  span: Span
+
+
+def note_name(uri: str) -> str:
+  """Returns the name that other notes use to link to the note at `uri`.
+
+  A note's name is its file name without the `.note` extension. For example,
+  `file:///home/notes/my%20idea.note` is linked to with `[[my idea]]`.
+  """
+  name = posixpath.basename(parse.unquote(parse.urlparse(uri).path))
+  if name.endswith(".note"):
+    name = name[:-len(".note")]
+  return name
+
+
+def renamed_uri(uri: str, name: str) -> str:
+  """Returns the uri that the note at `uri` would have if it were `name`."""
+  parsed = parse.urlparse(uri)
+  path = posixpath.join(posixpath.dirname(parsed.path),
+                        parse.quote(name + ".note"))
+  return parse.urlunparse(parsed._replace(path=path))
+
+
+def parse_links(text: str) -> List[Link]:
+  """Returns all of the links present in the text of a note, in order."""
+  links = []
+  for line_idx, line in enumerate(text.split("\n")):
+    if "[[" not in line:
+      continue
+    for match in _LINK_PATTERN.finditer(line):
+      start = lsp_message.utf16_len(line[:match.start(1)])
+      links.append(
+          Link(target=match.group(1),
+               span=Span(line=line_idx,
+                         start=start,
+                         end=start + lsp_message.utf16_len(match.group(1)))))
+  return links
+
+
+class NoteIndex:
+  """Stores the links of every known note, as well as their backlinks."""
+
+  def __init__(self):
+    # Maps a note's uri to the links present in that note.
+    self._links: Dict[str, List[Link]] = {}
+    # Maps a link target to the uris that reference it, and where.
+    self._backlinks: Dict[str, Dict[str, List[Span]]] = {}
+    # Maps a note's name to its uri.
+    self._uris_by_name: Dict[str, str] = {}
+    # The total number of links in every note.
+    self._num_links = 0
+
+  def update(self, uri: str, text: str) -> bool:
+    """Replaces all of the links recorded for `uri` with those in `text`.
+
+    Returns:
+      True if `uri` is a new note, or if the set of notes it links to changed.
+      Edits that only move links around return False.
+    """
+    is_new = uri not in self._links
+    old_targets = self.targets(uri)
+    self.remove(uri)
+    links = parse_links(text)
+    self._links[uri] = links
+    self._num_links += len(links)
+    self._uris_by_name[note_name(uri)] = uri
+    for link in links:
+      self._backlinks.setdefault(link.target,
+                                 {}).setdefault(uri, []).append(link.span)
+    return is_new or self.targets(uri) != old_targets
+
+  def remove(self, uri: str):
+    """Forgets all of the links recorded for `uri`."""
+    if uri not in self._links:
+      return
+    if self._uris_by_name.get(note_name(uri)) == uri:
+      del self._uris_by_name[note_name(uri)]
+    links = self._links.pop(uri)
+    self._num_links -= len(links)
+    for link in links:
+      referrers = self._backlinks.get(link.target)
+      if referrers is None:
+        continue
+      referrers.pop(uri, None)
+      if not referrers:
+        del self._backlinks[link.target]
+
+  def links(self, uri: str) -> List[Link]:
+    """Returns the links present in `uri`."""
+    return self._links.get(uri, [])
+
+  def targets(self, uri: str) -> Set[str]:
+    """Returns the names of the notes that `uri` links to."""
+    return {link.target for link in self._links.get(uri, [])}
+
+  def link_at(self, uri: str, line: int, character: int) -> Optional[Link]:
+    """Returns the link in `uri` whose target covers the position, if any."""
+    for link in self._links.get(uri, []):
+      if link.span.contains(line, character):
+        return link
+    return None
+
+  def uri_for(self, name: str) -> Optional[str]:
+    """Returns the uri of the indexed note called `name`, if there is one."""
+    return self._uris_by_name.get(name)
+
+  def backlinks(self, target: str) -> Dict[str, List[Span]]:
+    """Returns all of the places that link to `target`, grouped by uri."""
+    return self._backlinks.get(target, {})
+
+  def num_notes(self) -> int:
+    """Returns the number of indexed notes."""
+    return len(self._links)
+
+  def num_links(self) -> int:
+    """Returns the total number of links in every indexed note."""
+    return self._num_links
+
+  def uris(self) -> List[str]:
+    """Returns the uri of every indexed note."""
+    return list(self._links)
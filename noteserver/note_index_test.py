@@ -0,0 +1,111 @@
+"""Tests for note_index.py"""
+
+import unittest
+from noteserver import note_index
+
+
+class ParseLinksTest(unittest.TestCase):
+  """Tests extracting links from the text of a note."""
+
+  def test_no_links(self):
+    """A note without links produces nothing."""
+    self.assertEqual(note_index.parse_links("just text\n[not a link]"), [])
+
+  def test_links_on_multiple_lines(self):
+    """Spans cover the link target on the correct line."""
+    self.assertEqual(
+        note_index.parse_links("see [[foo]]\n\n[[bar]] and [[foo]]"), [
+            note_index.Link("foo", note_index.Span(line=0, start=6, end=9)),
+            note_index.Link("bar", note_index.Span(line=2, start=2, end=5)),
+            note_index.Link("foo", note_index.Span(line=2, start=14, end=17)),
+        ])
+
+  def test_utf16_columns(self):
+    """Columns count characters outside the BMP as two code units."""
+    self.assertEqual(note_index.parse_links("😀 [[a😀]]"), [
+        note_index.Link("a😀", note_index.Span(line=0, start=5, end=8)),
+    ])
+
+
+class NoteIndexTest(unittest.TestCase):
+  """Tests the bookkeeping of links and backlinks."""
+
+  def test_backlinks(self):
+    """Backlinks are grouped by the referencing uri."""
+    index = note_index.NoteIndex()
+    index.update("a.note", "[[c]] [[c]]")
+    index.update("b.note", "[[c]]")
+    self.assertEqual(
+        index.backlinks("c"), {
+            "a.note": [
+                note_index.Span(line=0, start=2, end=3),
+                note_index.Span(line=0, start=8, end=9)
+            ],
+            "b.note": [note_index.Span(line=0, start=2, end=3)],
+        })
+
+  def test_update_replaces_old_links(self):
+    """Re-indexing a note removes the backlinks it no longer has."""
+    index = note_index.NoteIndex()
+    index.update("a.note", "[[b]] [[b]]")
+    index.update("a.note", "[[c]]")
+    self.assertEqual(index.backlinks("b"), {})
+    self.assertEqual(list(index.backlinks("c")), ["a.note"])
+
+  def test_counts(self):
+    """The number of notes and links is kept up to date."""
+    index = note_index.NoteIndex()
+    index.update("a.note", "[[b]] [[b]]")
+    index.update("b.note", "[[a]]")
+    index.update("a.note", "[[c]]")
+    self.assertEqual((index.num_notes(), index.num_links()), (2, 2))
+    index.remove("b.note")
+    self.assertEqual((index.num_notes(), index.num_links()), (1, 1))
+
+  def test_update_reports_changed_targets(self):
+    """Only new notes and changes to the set of targets are reported."""
+    index = note_index.NoteIndex()
+    self.assertTrue(index.update("a.note", "[[b]]"))
+    self.assertFalse(index.update("a.note", "moved [[b]] and [[b]]"))
+    self.assertTrue(index.update("a.note", "[[c]]"))
+    self.assertEqual(index.targets("a.note"), {"c"})
+
+  def test_link_at(self):
+    """Finds the link covering a position, including its boundaries."""
+    index = note_index.NoteIndex()
+    index.update("a.note", "x [[foo]]")
+    self.assertIsNone(index.link_at("a.note", 0, 0))
+    self.assertEqual(index.link_at("a.note", 0, 4).target, "foo")
+    self.assertEqual(index.link_at("a.note", 0, 7).target, "foo")
+    self.assertIsNone(index.link_at("b.note", 0, 4))
+
+
+class NoteNameTest(unittest.TestCase):
+  """Tests naming notes from their uris."""
+
+  def test_file_uri(self):
+    """Strips the directory, extension, and uri quoting."""
+    self.assertEqual(note_index.note_name("file:///home/notes/my%20idea.note"),
+                     "my idea")
+
+  def test_relative_path(self):
+    """Bare paths are named the same way."""
+    self.assertEqual(note_index.note_name("a.note"), "a")
+
+
+class RenamedUriTest(unittest.TestCase):
+  """Tests computing the uri of a renamed note."""
+
+  def test_file_uri(self):
+    """Keeps the directory and quotes the new name."""
+    self.assertEqual(
+        note_index.renamed_uri("file:///home/notes/old.note", "my idea"),
+        "file:///home/notes/my%20idea.note")
+
+  def test_uri_for(self):
+    """Indexed notes can be found by name until they are removed."""
+    index = note_index.NoteIndex()
+    index.update("file:///notes/a.note", "")
+    self.assertEqual(index.uri_for("a"), "file:///notes/a.note")
+    index.remove("file:///notes/a.note")
+    self.assertIsNone(index.uri_for("a"))
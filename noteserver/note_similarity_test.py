@@ -0,0 +1,113 @@
+"""Tests for note_similarity.py"""
+
+import unittest
+from unittest import mock
+from noteserver import note_similarity
+
+
+class SimilarityIndexTest(unittest.TestCase):
+  """Tests ranking notes by TF-IDF cosine similarity."""
+
+  def setUp(self):
+    self.index = note_similarity.SimilarityIndex()
+    self.index.update("cats.note", "Cats purr. Cats chase mice.")
+    self.index.update("kittens.note", "Kittens are young cats that purr.")
+    self.index.update("dogs.note", "Dogs bark and chase cars.")
+    self.index.update("taxes.note", "File taxes in April.")
+
+  def test_related(self):
+    """Notes sharing the most distinctive words rank first."""
+    related = self.index.related("cats.note", limit=10)
+    self.assertEqual([uri for uri, _ in related], ["kittens.note", "dogs.note"])
+    for _, score in related:
+      self.assertGreater(score, 0.0)
+      self.assertLessEqual(score, 1.0)
+
+  def test_limit(self):
+    """No more than `limit` notes are returned."""
+    self.assertEqual(len(self.index.related("cats.note", limit=1)), 1)
+
+  def test_identical_notes(self):
+    """Notes with the same text have a similarity of one."""
+    self.index.update("copy.note", "Cats purr. Cats chase mice.")
+    uri, score = self.index.related("cats.note", limit=1)[0]
+    self.assertEqual(uri, "copy.note")
+    self.assertAlmostEqual(score, 1.0)
+
+  def test_update_replaces_text(self):
+    """Only the latest text of a note is used."""
+    self.index.related("cats.note", limit=10)
+    self.index.update("taxes.note", "My cats purr")
+    self.index.update("kittens.note", "Nothing in common")
+    self.assertEqual(
+        [uri for uri, _ in self.index.related("cats.note", limit=10)],
+        ["taxes.note", "dogs.note"])
+
+  def test_unknown_note(self):
+    """Unknown notes, or notes without words, aren't related to anything."""
+    self.assertEqual(self.index.related("unknown.note", limit=10), [])
+    self.index.update("empty.note", "")
+    self.assertEqual(self.index.related("empty.note", limit=10), [])
+
+  def test_common_words_are_skipped(self):
+    """Words that appear in too many notes don't make notes related."""
+    with mock.patch.object(note_similarity, "_MIN_PRUNED_DOCUMENTS", 0), \
+        mock.patch.object(note_similarity, "_MAX_DOCUMENT_FRACTION", 0.5):
+      self.index.update("mice.note", "Mice purr, chase, and bark.")
+      self.assertEqual(
+          [uri for uri, _ in self.index.related("dogs.note", limit=10)],
+          ["mice.note"])
+
+
+class EvictionTest(unittest.TestCase):
+  """Tests keeping the matrix within a memory budget."""
+
+  def setUp(self):
+    self.texts = {
+        "cats.note": "Cats purr. Cats chase mice.",
+        "kittens.note": "Kittens are young cats that purr.",
+        "dogs.note": "Dogs bark and chase cars.",
+        "taxes.note": "File taxes in April.",
+    }
+    self.unbounded = note_similarity.SimilarityIndex()
+    self.index = note_similarity.SimilarityIndex(max_bytes=0,
+                                                 load=self.texts.get)
+    self.index.pin("cats.note")
+    for uri, text in self.texts.items():
+      self.unbounded.update(uri, text)
+      self.index.update(uri, text)
+
+  def test_unpinned_notes_are_evicted(self):
+    """Only pinned notes stay resident when the budget is exceeded."""
+    self.assertEqual(self.index.get_content()["residentNotes"], 1)
+    self.assertEqual(self.index.get_content()["evictedNotes"], 3)
+    self.index.unpin("cats.note")
+    self.assertEqual(self.index.get_content(), {
+        "residentNotes": 0,
+        "evictedNotes": 4,
+        "estimatedBytes": 0,
+    })
+
+  def test_evicted_notes_are_reread(self):
+    """Evicted notes are scored the same as resident ones."""
+    for uri in ["cats.note", "dogs.note"]:
+      expected = self.unbounded.related(uri, limit=10)
+      related = self.index.related(uri, limit=10)
+      self.assertEqual([uri for uri, _ in related],
+                       [uri for uri, _ in expected])
+      for (_, score), (_, expected_score) in zip(related, expected):
+        self.assertAlmostEqual(score, expected_score)
+
+  def test_removed_evicted_notes(self):
+    """Removing an evicted note forgets its words."""
+    self.index.remove("kittens.note")
+    self.unbounded.remove("kittens.note")
+    self.assertEqual(self.index.related("cats.note", limit=10),
+                     self.unbounded.related("cats.note", limit=10))
+
+  def test_unreadable_evicted_notes(self):
+    """Evicted notes that can no longer be read aren't related to anything."""
+    del self.texts["kittens.note"]
+    self.assertEqual(
+        [uri for uri, _ in self.index.related("cats.note", limit=10)],
+        ["dogs.note"])
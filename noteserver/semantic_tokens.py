@@ -0,0 +1,284 @@
+"""Produces LSP semantic tokens that highlight the syntax of notes.
+
+Notes support the following syntax:
+
+```
+# A heading
+- [ ] A checkbox, which may link to [[another note]] or be #tagged.
+```
+
+Tokens are computed and encoded one line at a time and cached. When a note
+changes, only the lines between the unchanged prefix and suffix of the note are
+tokenized again. Clients that already have a previous result receive a delta,
+which is computed from the lines that changed since then rather than from the
+whole token array.
+"""
+
+import dataclasses
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from noteserver import lsp_message
+
+# The legend sent to the client. A token's type is an index into this list.
+TOKEN_TYPES = ["keyword", "string", "macro", "enumMember"]
+_HEADING = TOKEN_TYPES.index("keyword")
+_LINK = TOKEN_TYPES.index("string")
+_TAG = TOKEN_TYPES.index("macro")
+_CHECKBOX = TOKEN_TYPES.index("enumMember")
+
+_HEADING_PATTERN = re.compile(r"#+\s")
+_CHECKBOX_PATTERN = re.compile(r"\s*[-*]\s+(\[[ xX]\])")
+_LINK_OR_TAG_PATTERN = re.compile(r"(\[\[[^\[\]\n]+\]\])|(?<![\w#])(#[\w-]+)")
+
+# Common affixes are first found in blocks of this many items, which compares
+# them in C rather than one at a time in Python.
+_AFFIX_BLOCK_SIZE = 256
+
+# A (start character, length, token type) triple on a single line.
+Token = Tuple[int, int, int]
+
+
+def tokenize_line(line: str) -> List[Token]:
+  """Returns the tokens in a single line of a note, in order.
+
+  Like LSP positions, starts and lengths count UTF-16 code units.
+  """
+  if _HEADING_PATTERN.match(line):
+    return [(0, lsp_message.utf16_len(line), _HEADING)]
+  # (start, end, token type) triples, counting code points.
+  spans = []
+  checkbox = _CHECKBOX_PATTERN.match(line)
+  if checkbox:
+    spans.append((checkbox.start(1), checkbox.end(1), _CHECKBOX))
+  for match in _LINK_OR_TAG_PATTERN.finditer(line):
+    spans.append(
+        (match.start(), match.end(), _LINK if match.group(1) else _TAG))
+  if line.isascii():
+    return [(start, end - start, kind) for start, end, kind in spans]
+  return [(lsp_message.utf16_len(line[:start]),
+           lsp_message.utf16_len(line[start:end]), kind)
+          for start, end, kind in spans]
+
+
+def _encode_line(tokens: List[Token]) -> List[int]:
+  """Encodes the tokens of a single line using LSP's relative format.
+
+  The deltaLine of the first token depends on which line holds the previous
+  token, so it is left as 0 here and filled in by `_encode`.
+  """
+  data: List[int] = []
+  previous_start = 0
+  for start, length, token_type in tokens:
+    data.extend((0, start - previous_start, length, token_type, 0))
+    previous_start = start
+  return data
+
+
+def _encode(line_data: Sequence[List[int]], first_line: int,
+            previous_line: int) -> Tuple[List[int], int]:
+  """Joins lines encoded by `_encode_line` into part of a token array.
+
+  Args:
+    line_data: The encoded tokens of consecutive lines.
+    first_line: The line number of `line_data[0]`.
+    previous_line: The line of the last token before `first_line`, or 0 if
+      there is none.
+
+  Returns:
+    The joined data, and the line of its last token. If there are no tokens,
+    that is `previous_line`.
+  """
+  data: List[int] = []
+  for line, encoded in enumerate(line_data, first_line):
+    if encoded:
+      data.append(line - previous_line)
+      data.extend(encoded[1:])
+      previous_line = line
+  return data, previous_line
+
+
+def _find_tokens(line_data: Sequence[List[int]], line: int, step: int) -> int:
+  """Returns the nearest line with tokens, moving from `line` by `step`.
+
+  Returns -1 or `len(line_data)` if no line in that direction has tokens.
+  """
+  while 0 <= line < len(line_data) and not line_data[line]:
+    line += step
+  return line
+
+
+def _common_affixes(old: Sequence[Any], new: Sequence[Any]) -> Tuple[int, int]:
+  """Returns the lengths of the common prefix and suffix of `old` and `new`.
+
+  The prefix and suffix never overlap, in either sequence.
+  """
+  prefix = 0
+  max_prefix = min(len(old), len(new))
+  while (prefix + _AFFIX_BLOCK_SIZE <= max_prefix and
+         old[prefix:prefix + _AFFIX_BLOCK_SIZE]
+         == new[prefix:prefix + _AFFIX_BLOCK_SIZE]):
+    prefix += _AFFIX_BLOCK_SIZE
+  while prefix < max_prefix and old[prefix] == new[prefix]:
+    prefix += 1
+  suffix = 0
+  max_suffix = max_prefix - prefix
+  while (suffix + _AFFIX_BLOCK_SIZE <= max_suffix and
+         old[len(old) - suffix - _AFFIX_BLOCK_SIZE:len(old) - suffix]
+         == new[len(new) - suffix - _AFFIX_BLOCK_SIZE:len(new) - suffix]):
+    suffix += _AFFIX_BLOCK_SIZE
+  while suffix < max_suffix and old[-1 - suffix] == new[-1 - suffix]:
+    suffix += 1
+  return prefix, suffix
+
+
+def _diff(old: List[int], new: List[int]) -> List[Dict[str, Any]]:
+  """Returns the SemanticTokensEdits that turn `old` into `new`."""
+  if old == new:
+    return []
+  prefix, suffix = _common_affixes(old, new)
+  return [{
+      "start": prefix,
+      "deleteCount": len(old) - prefix - suffix,
+      "data": new[prefix:len(new) - suffix],
+  }]
+
+
+@dataclasses.dataclass
+class _Change:
+  """The lines of a note whose tokens changed since the last result."""
+  # The changed lines are `start:end` of the current lines...
+  start: int
+  end: int
+  # ...and were encoded as this in the last result.
+  old_line_data: List[List[int]]
+
+
+def _change_edits(line_data: List[List[int]],
+                  change: _Change) -> List[Dict[str, Any]]:
+  """Returns the SemanticTokensEdits that apply `change` to the last result.
+
+  Only the changed lines are encoded. The rest of the token array is the same
+  as in the last result, except for the deltaLine of the first token after the
+  change.
+  """
+  previous_line = max(_find_tokens(line_data, change.start - 1, -1), 0)
+  old, old_last_line = _encode(change.old_line_data, change.start,
+                               previous_line)
+  new, new_last_line = _encode(line_data[change.start:change.end], change.start,
+                               previous_line)
+  next_line = _find_tokens(line_data, change.end, 1)
+  if next_line < len(line_data):
+    growth = change.end - change.start - len(change.old_line_data)
+    old.append(next_line - growth - old_last_line)
+    new.append(next_line - new_last_line)
+  edits = _diff(old, new)
+  # The lines before the change are the same as in the last result.
+  offset = sum(map(len, line_data[:change.start]))
+  for edit in edits:
+    edit["start"] += offset
+  return edits
+
+
+@dataclasses.dataclass
+class _Document:
+  """The cached tokens of one note."""
+  lines: List[str]
+  # The tokens of each line, encoded by `_encode_line`.
+  line_data: List[List[int]]
+  # The last result sent to the client, which deltas are computed against.
+  result_id: Optional[str] = None
+  change: Optional[_Change] = None
+
+
+class SemanticTokenCache:
+  """Tracks the semantic tokens of every open note."""
+
+  def __init__(self):
+    """Creates an empty cache."""
+    self._documents: Dict[str, _Document] = {}
+    self._next_result_id = 0
+
+  def update(self, uri: str, text: str):
+    """Re-tokenizes the lines of `uri` that differ from its cached text."""
+    lines = text.split("\n")
+    document = self._documents.get(uri)
+    if document is None:
+      self._documents[uri] = _Document(
+          lines, [_encode_line(tokenize_line(line)) for line in lines])
+      return
+    old_lines = document.lines
+    document.lines = lines
+    prefix, suffix = _common_affixes(old_lines, lines)
+    old_end = len(old_lines) - suffix
+    new_line_data = [
+        _encode_line(tokenize_line(line))
+        for line in lines[prefix:len(lines) - suffix]
+    ]
+    if (len(lines) == len(old_lines) and
+        new_line_data == document.line_data[prefix:old_end]):
+      return
+    if document.result_id is not None:
+      self._record_change(document, prefix, old_end,
+                          len(lines) - len(old_lines))
+    document.line_data[prefix:old_end] = new_line_data
+
+  @staticmethod
+  def _record_change(document: _Document, start: int, end: int, growth: int):
+    """Adds lines `start:end` to the lines that changed since the last result.
+
+    Args:
+      document: The note that is about to change.
+      start: The first line that will change.
+      end: The line after the last one that will change, before the change.
+      growth: The number of lines that the change will add.
+    """
+    change = document.change or _Change(start, start, [])
+    new_start = min(change.start, start)
+    new_end = max(change.end, end)
+    # Lines outside of the previous change still hold their old tokens.
+    change.old_line_data = (document.line_data[new_start:change.start] +
+                            change.old_line_data +
+                            document.line_data[change.end:new_end])
+    change.start = new_start
+    change.end = new_end + growth
+    document.change = change
+
+  def remove(self, uri: str):
+    """Forgets the tokens of `uri`."""
+    self._documents.pop(uri, None)
+
+  def _produce_result(self, document: _Document):
+    """Records the current tokens of `document` as the latest result."""
+    if document.result_id is None or document.change is not None:
+      document.result_id = str(self._next_result_id)
+      self._next_result_id += 1
+    document.change = None
+
+  def full(self, uri: str) -> Dict[str, Any]:
+    """Returns the SemanticTokens for the whole of `uri`."""
+    document = self._documents.get(uri)
+    if document is None:
+      return {"data": []}
+    self._produce_result(document)
+    data, _ = _encode(document.line_data, 0, 0)
+    return {"resultId": document.result_id, "data": data}
+
+  def delta(self, uri: str, previous_result_id: str) -> Dict[str, Any]:
+    """Returns the changes to the tokens of `uri` since a previous result.
+
+    Args:
+      uri: The note to produce tokens for.
+      previous_result_id: The resultId of the tokens the client already has.
+
+    Returns:
+      A SemanticTokensDelta if `previous_result_id` is the latest result sent
+      for `uri`. Otherwise, the full SemanticTokens.
+    """
+    document = self._documents.get(uri)
+    if document is None or document.result_id != previous_result_id:
+      return self.full(uri)
+    if document.change is None:
+      return {"resultId": document.result_id, "edits": []}
+    edits = _change_edits(document.line_data, document.change)
+    self._produce_result(document)
+    return {"resultId": document.result_id, "edits": edits}
@@ -0,0 +1,146 @@
+"""Tests for semantic_tokens.py"""
+
+import random
+import unittest
+from unittest import mock
+from noteserver import semantic_tokens
+
+_HEADING = semantic_tokens.TOKEN_TYPES.index("keyword")
+_LINK = semantic_tokens.TOKEN_TYPES.index("string")
+_TAG = semantic_tokens.TOKEN_TYPES.index("macro")
+_CHECKBOX = semantic_tokens.TOKEN_TYPES.index("enumMember")
+
+
+class TokenizeLineTest(unittest.TestCase):
+  """Tests highlighting the syntax of a single line."""
+
+  def test_heading(self):
+    """Headings cover the whole line, including any links or tags."""
+    self.assertEqual(semantic_tokens.tokenize_line("## Title [[a]] #b"),
+                     [(0, 17, _HEADING)])
+
+  def test_tag_is_not_heading(self):
+    """A tag at the start of a line is not a heading."""
+    self.assertEqual(semantic_tokens.tokenize_line("#tag"), [(0, 4, _TAG)])
+
+  def test_checkbox_link_and_tag(self):
+    """Tokens are produced in order of their position."""
+    self.assertEqual(
+        semantic_tokens.tokenize_line("  - [x] see [[a b]] #todo, not a#b"),
+        [(4, 3, _CHECKBOX), (12, 7, _LINK), (20, 5, _TAG)])
+
+  def test_plain_text(self):
+    """Lines without syntax have no tokens."""
+    self.assertEqual(semantic_tokens.tokenize_line("just [text]"), [])
+
+  def test_utf16_positions(self):
+    """Positions and lengths count UTF-16 code units, like LSP does."""
+    self.assertEqual(semantic_tokens.tokenize_line("é😀 [[😀]] #tag"),
+                     [(4, 6, _LINK), (11, 4, _TAG)])
+    self.assertEqual(semantic_tokens.tokenize_line("# 😀"), [(0, 4, _HEADING)])
+
+
+class SemanticTokenCacheTest(unittest.TestCase):
+  """Tests producing full and delta results."""
+
+  def test_full(self):
+    """Positions are relative to the previous token."""
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "# Title\n\n[[a]] #b")
+    self.assertEqual(cache.full("a.note")["data"], [
+        0, 0, 7, _HEADING, 0,
+        2, 0, 5, _LINK, 0,
+        0, 6, 2, _TAG, 0,
+    ])  # yapf: disable
+
+  def test_unknown_note(self):
+    """Notes that were never opened have no tokens."""
+    cache = semantic_tokens.SemanticTokenCache()
+    self.assertEqual(cache.full("a.note"), {"data": []})
+
+  def test_delta(self):
+    """Only the changed part of the token array is sent."""
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "#a\n#b\n#c")
+    result_id = cache.full("a.note")["resultId"]
+    cache.update("a.note", "#a\n[[b]]\n#c")
+    delta = cache.delta("a.note", result_id)
+    self.assertNotEqual(delta["resultId"], result_id)
+    self.assertEqual(delta["edits"], [{
+        "start": 7,
+        "deleteCount": 2,
+        "data": [5, _LINK]
+    }])
+
+  def test_delta_without_changes(self):
+    """An unchanged note produces no edits and keeps its resultId."""
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "#a")
+    result_id = cache.full("a.note")["resultId"]
+    self.assertEqual(cache.delta("a.note", result_id), {
+        "resultId": result_id,
+        "edits": []
+    })
+
+  def test_delta_with_stale_result_id(self):
+    """Falls back to full tokens if the client's result is unknown."""
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "#a")
+    self.assertIn("data", cache.delta("a.note", "stale"))
+
+  def test_update_only_tokenizes_changed_lines(self):
+    """Unchanged lines before and after an edit are not tokenized again."""
+    cache = semantic_tokens.SemanticTokenCache()
+    lines = [f"line {i} #tag" for i in range(1000)]
+    cache.update("a.note", "\n".join(lines))
+    lines[500] = "[[edited]]"
+    with mock.patch.object(semantic_tokens,
+                           "tokenize_line",
+                           wraps=semantic_tokens.tokenize_line) as tokenize:
+      cache.update("a.note", "\n".join(lines))
+      tokenize.assert_called_once_with("[[edited]]")
+    expected = semantic_tokens.SemanticTokenCache()
+    expected.update("a.note", "\n".join(lines))
+    self.assertEqual(
+        cache.full("a.note")["data"],
+        expected.full("a.note")["data"])
+
+  def test_deltas_reproduce_full_results(self):
+    """Applying each delta to the previous data gives the new full data."""
+    rng = random.Random(0)
+    choices = ["", "text", "#tag", "# heading", "- [ ] [[link]] #a", "é #😀"]
+    lines = [rng.choice(choices) for _ in range(30)]
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "\n".join(lines))
+    result = cache.full("a.note")
+    data = result["data"]
+    for _ in range(200):
+      # Replace, insert, or delete a few lines, sometimes several times
+      # between results.
+      for _ in range(rng.randint(1, 3)):
+        start = rng.randrange(len(lines) + 1)
+        end = min(len(lines), start + rng.randint(0, 3))
+        lines[start:end] = [
+            rng.choice(choices) for _ in range(rng.randint(0, 3))
+        ]
+        cache.update("a.note", "\n".join(lines))
+      delta = cache.delta("a.note", result["resultId"])
+      for edit in delta["edits"]:
+        data[edit["start"]:edit["start"] + edit["deleteCount"]] = edit["data"]
+      expected = semantic_tokens.SemanticTokenCache()
+      expected.update("a.note", "\n".join(lines))
+      self.assertEqual(data, expected.full("a.note")["data"])
+      result = delta
+
+  def test_delta_with_repeated_lines(self):
+    """Inserting a line into many identical lines produces a valid delta."""
+    cache = semantic_tokens.SemanticTokenCache()
+    cache.update("a.note", "\n".join(["#a"] * 1000))
+    result = cache.full("a.note")
+    data = result["data"]
+    cache.update("a.note", "\n".join(["#a"] * 500 + [""] + ["#a"] * 501))
+    for edit in cache.delta("a.note", result["resultId"])["edits"]:
+      data[edit["start"]:edit["start"] + edit["deleteCount"]] = edit["data"]
+    expected = semantic_tokens.SemanticTokenCache()
+    expected.update("a.note", "\n".join(["#a"] * 500 + [""] + ["#a"] * 501))
+    self.assertEqual(data, expected.full("a.note")["data"])
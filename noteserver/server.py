@@ -7,7 +7,7 @@ This module exposes a Server class that buffers messages from its input, sends
 messages to its dispatcher callback, and forwards responses to its output.
 """
 
-from typing import Iterable, BinaryIO
+from typing import Iterable, BinaryIO, Optional
 import logging
 from noteserver import lsp_message
 from noteserver import dispatcher
@@ -52,11 +52,15 @@ def lsp_message_source(
       raise ValueError(
           f"Space index {first_space} > Separator index {first_separator}")
     content_length = int(lsp_buffer[first_space:first_separator])
-    content = buffered_reader.read(content_length)
-    if len(content) != content_length:
-      raise ValueError(
-          f"Expected to read {content_length} bytes. Read {len(content)}")
-    lsp_buffer.extend(content)
+    # Unbuffered readers, such as pipes, may return fewer bytes than requested
+    # before the full content has arrived.
+    message_length = len(lsp_buffer) + content_length
+    while len(lsp_buffer) < message_length:
+      content = buffered_reader.read(message_length - len(lsp_buffer))
+      if not content:
+        raise ValueError(f"Expected to read {content_length} bytes. Read "
+                         f"{content_length - message_length + len(lsp_buffer)}")
+      lsp_buffer.extend(content)
     yield lsp_message.parse(lsp_buffer)
     lsp_buffer.clear()
   # By the time we reach this, the buffer should be empty.
@@ -67,17 +71,25 @@ def lsp_message_source(
 class Server:  # pylint: disable=too-few-public-methods
   """Responsible for handling IO."""
 
-  def __init__(self, reader: BinaryIO, writer: BinaryIO):
-    """LspMessages read from reader and written to writer."""
+  def __init__(self,
+               reader: BinaryIO,
+               writer: BinaryIO,
+               memory_budget: Optional[int] = None):
+    """LspMessages read from reader and written to writer.
+
+    `memory_budget` is passed on to the dispatcher, see `Dispatcher`.
+    """
     self._reader = reader
     self._writer = writer
-    self._dispatcher = dispatcher.Dispatcher()
+    self._dispatcher = dispatcher.Dispatcher(memory_budget)
 
   def run(self):
     """Runs the server."""
     for client_message in lsp_message_source(self._reader):
       logging.info("Read %s", client_message)
+      # Dispatchers may produce messages lazily, so each one is flushed as soon
+      # as it is available rather than after the whole response is built.
       for server_message in self._dispatcher(client_message):
         self._writer.write(server_message.serialize())
+        self._writer.flush()
         logging.info("Wrote %s", server_message)
-      self._writer.flush()
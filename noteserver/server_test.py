@@ -4,6 +4,7 @@ import io
 import unittest
 from noteserver import server
 from noteserver import lsp_message
+from noteserver import testing_util
 
 
 class ServerTest(unittest.TestCase):
@@ -23,10 +24,50 @@ class ServerTest(unittest.TestCase):
                                    message="test/method not implemented"))
     self.assertEqual(actual, expected)
 
+  def test_partial_results_are_written(self):
+    """Every streamed partial result reaches the writer before the response."""
+    did_open = lsp_message.LspNotification(
+        method="textDocument/didOpen",
+        params={"textDocument": {
+            "uri": "a.note",
+            "text": "[[foo]]"
+        }})
+    references = lsp_message.LspRequest(id=1,
+                                        method="textDocument/references",
+                                        params={
+                                            "textDocument": {
+                                                "uri": "a.note"
+                                            },
+                                            "position": {
+                                                "line": 0,
+                                                "character": 3
+                                            },
+                                            "partialResultToken": "tok"
+                                        })
+    reader = io.BytesIO(did_open.serialize() + references.serialize())
+    writer = io.BytesIO()
+    server.Server(reader, writer).run()
+    writer.seek(0)
+    actual = list(server.lsp_message_source(writer))
+    self.assertEqual(len(actual), 2)
+    self.assertEqual(actual[0].method, "$/progress")
+    self.assertEqual(actual[1], lsp_message.LspResponse(id=1, result=[]))
+
 
 class LspMessageSourceTest(unittest.TestCase):
   """Tests the message IO behavior of server.py"""
 
+  def test_read_one_byte_at_a_time(self):
+    """Messages are read correctly from readers that return short reads."""
+    request = lsp_message.LspRequest(id=1,
+                                     method="request",
+                                     params={"foo": "bar"})
+    notification = lsp_message.LspNotification(method="notification")
+    reader = testing_util.OneByteReader(request.serialize() +
+                                        notification.serialize())
+    actual = list(server.lsp_message_source(reader))
+    self.assertEqual(actual, [request, notification])
+
   def test_read_request_and_response(self):
     """Multiple messages of different types can be read."""
     request = lsp_message.LspRequest(id=1,
@@ -0,0 +1,22 @@
+"""Helpers shared by the tests and benchmarks of noteserver."""
+
+import io
+
+
+class OneByteReader(io.RawIOBase):
+  """A reader that returns at most one byte per read, like a slow pipe."""
+
+  def __init__(self, data: bytes):
+    super().__init__()
+    self._data = data
+    self._position = 0
+
+  def readable(self) -> bool:
+    return True
+
+  def readinto(self, buffer) -> int:
+    if self._position >= len(self._data) or not buffer:
+      return 0
+    buffer[0] = self._data[self._position]
+    self._position += 1
+    return 1
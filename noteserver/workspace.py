@@ -0,0 +1,60 @@
+"""Finds and reads the notes stored in the client's workspace.
+
+Editors only send the text of the notes they have open. Answering questions
+about every note, like which notes link to the one being renamed, requires
+reading the rest of the notes from disk.
+"""
+
+import os
+import pathlib
+from typing import Iterator, Optional
+from urllib import parse
+
+# Files with this extension are notes.
+NOTE_EXTENSION = ".note"
+
+
+def uri_to_path(uri: str) -> Optional[str]:
+  """Returns the local path of a `file://` uri, or None for other schemes."""
+  parsed = parse.urlparse(uri)
+  if parsed.scheme != "file":
+    return None
+  return parse.unquote(parsed.path)
+
+
+def path_to_uri(path: str) -> str:
+  """Returns the `file://` uri of a local path."""
+  return pathlib.Path(os.path.abspath(path)).as_uri()
+
+
+def is_note(uri: str) -> bool:
+  """Returns true if `uri` names a note."""
+  return parse.urlparse(uri).path.endswith(NOTE_EXTENSION)
+
+
+def find_notes(root_uri: str) -> Iterator[str]:
+  """Yields the uri of every note under the directory `root_uri`.
+
+  Hidden directories, such as `.git`, are skipped.
+  """
+  root = uri_to_path(root_uri)
+  if root is None:
+    return
+  for directory, subdirectories, files in os.walk(root):
+    subdirectories[:] = sorted(
+        name for name in subdirectories if not name.startswith("."))
+    for name in sorted(files):
+      if name.endswith(NOTE_EXTENSION):
+        yield path_to_uri(os.path.join(directory, name))
+
+
+def read_note(uri: str) -> Optional[str]:
+  """Returns the text of the note at `uri`, or None if it can't be read."""
+  path = uri_to_path(uri)
+  if path is None:
+    return None
+  try:
+    with open(path, encoding="utf-8") as note_file:
+      return note_file.read()
+  except (OSError, UnicodeDecodeError):
+    return None
@@ -0,0 +1,50 @@
+"""Tests for workspace.py"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from noteserver import workspace
+
+
+class WorkspaceTest(unittest.TestCase):
+  """Tests finding and reading notes on disk."""
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.root)
+    for path, text in [("a.note", "[[b]]"), ("sub dir/b.note", "é"),
+                       ("c.txt", ""), (".git/d.note", "")]:
+      os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+      with open(os.path.join(self.root, path), "w",
+                encoding="utf-8") as note_file:
+        note_file.write(text)
+
+  def test_find_notes(self):
+    """Notes are found in subdirectories, but not in hidden directories."""
+    self.assertEqual(
+        list(workspace.find_notes(workspace.path_to_uri(self.root))), [
+            workspace.path_to_uri(os.path.join(self.root, "a.note")),
+            workspace.path_to_uri(os.path.join(self.root, "sub dir/b.note")),
+        ])
+
+  def test_find_notes_outside_file_system(self):
+    """Only file uris can be searched."""
+    self.assertEqual(list(workspace.find_notes("untitled:notes")), [])
+
+  def test_read_note(self):
+    """Notes are read as UTF-8, with spaces in their uri unquoted."""
+    uri = workspace.path_to_uri(os.path.join(self.root, "sub dir/b.note"))
+    self.assertIn("%20", uri)
+    self.assertEqual(workspace.read_note(uri), "é")
+
+  def test_read_missing_note(self):
+    """Notes that can't be read produce None."""
+    self.assertIsNone(
+        workspace.read_note(
+            workspace.path_to_uri(os.path.join(self.root, "missing.note"))))
+
+  def test_is_note(self):
+    """Only uris with the note extension are notes."""
+    self.assertTrue(workspace.is_note("file:///a%20b.note"))
+    self.assertFalse(workspace.is_note("file:///a.txt"))